@@ -0,0 +1,418 @@
+"""无界面基准测试（可在 Linux 上运行）
+
+用内存假剪贴板（MemoryClipboardSource）代替 Windows 剪贴板，Qt 使用 offscreen 平台，
+在临时目录中生成指定规模和组成的合成历史，测量各热点路径的耗时、内存和磁盘占用。
+
+    python benchmark.py --items 1000 --mix short=0.9,large=0.05,image=0.05 --output result.json
+    python benchmark.py --baseline baseline.json      # 与保存的基线比较，变慢超过容差时退出码为 1
+    python benchmark.py --save-baseline baseline.json
+
+所有指标都是越小越好，单位见名称后缀（_ms、_us、_bytes、_count）。
+"""
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import argparse
+import json
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QApplication
+
+from config import (
+    MAX_ITEMS,
+    SQLITE_MAX_ITEMS,
+    JOURNAL_COMPACT_THRESHOLD,
+    JOURNAL_LAZY_BYTES,
+    DISK_BUDGET,
+    SEARCH_INDEX_MAX_CHARS,
+    IMAGE_NEAR_DUPLICATE_DISTANCE,
+    TEXT_COMPRESS_THRESHOLD,
+    TEXT_COMPRESS_PREFIX_CHARS,
+    TEXT_COMPRESS_CODEC,
+    THUMB_SIZE,
+    PAGE_SIZE,
+    IMAGE_FORMAT,
+    PNG_COMPRESS_LEVEL,
+    WEBP_METHOD,
+    PIXMAP_CACHE_BYTES,
+    SAVE_DELAY,
+)
+from main import create_policy, max_age
+from history_manager import HistoryManager
+from history_entry import format_item_text
+from journal import HistoryJournal
+from storage import SqliteStorage
+from clipboard_source import MemoryClipboardSource
+from clipboard_worker import ClipboardWorker
+from image_codec import ImageCodec, encode_pixels
+from persistence import PersistenceThread
+from gui import ClipboardGUI
+
+WORDS = (
+    "clipboard history search paste image text python window qt journal blob "
+    "index budget cache thread worker preview hotkey format digest storage "
+    "剪贴板 历史 搜索 粘贴 图片 文本 窗口 预览"
+).split()
+
+# 用于 filter_list 的查询：常见词、只匹配一条、无匹配、单个字符
+QUERIES = {"common": "clipboard", "rare": "#7 ", "miss": "zzqxj", "char": "a"}
+
+
+# ---------- 合成数据 ----------
+
+def parse_mix(text):
+    """"short=0.9,large=0.05,image=0.05" -> {"short": 0.9, ...}"""
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in ("short", "large", "image"):
+            raise argparse.ArgumentTypeError(f"未知的条目类型: {kind}")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def make_image(rng, size):
+    """类似截图的图片：大块纯色区域加少量细节，PNG 压缩率接近真实截图"""
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGB", size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    draw = ImageDraw.Draw(img)
+    w, h = size
+    for _ in range(60):
+        x, y = rng.randrange(w), rng.randrange(h)
+        color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        draw.rectangle([x, y, x + rng.randrange(w // 4 + 1), y + rng.randrange(h // 4 + 1)], fill=color)
+    for _ in range(200):
+        draw.text((rng.randrange(w), rng.randrange(h)), " ".join(rng.sample(WORDS[:20], 4)),
+                  fill=(0, 0, 0))
+    return img
+
+
+def synthetic_items(count, mix, large_bytes, image_size, seed):
+    """生成 count 个剪贴板内容：文本为 str，图片为 PIL 图片"""
+    rng = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    block = " ".join(rng.choice(WORDS) for _ in range(large_bytes // 6 + 1))[:large_bytes]
+    items = []
+    for i in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "short":
+            items.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 20))) + f" #{i} ")
+        elif kind == "large":
+            offset = rng.randrange(len(block))
+            items.append(f"#{i} " + block[offset:] + block[:offset])
+        else:
+            items.append(make_image(rng, image_size))
+    return items
+
+
+# ---------- 工具 ----------
+
+def ms_since(started):
+    return (time.perf_counter() - started) * 1000
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def dir_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def create_storage(backend, directory):
+    if backend == "sqlite":
+        return SqliteStorage(os.path.join(directory, "history.db"), SQLITE_MAX_ITEMS,
+                             JOURNAL_COMPACT_THRESHOLD, DISK_BUDGET, max_age())
+    return HistoryJournal(os.path.join(directory, "history.jsonl"),
+                          JOURNAL_COMPACT_THRESHOLD, JOURNAL_LAZY_BYTES)
+
+
+def create_history_manager(backend, directory):
+    storage = create_storage(backend, directory)
+    history_manager = HistoryManager(
+        MAX_ITEMS, storage, None, os.path.join(directory, "blobs"), SEARCH_INDEX_MAX_CHARS,
+        TEXT_COMPRESS_THRESHOLD, TEXT_COMPRESS_PREFIX_CHARS, TEXT_COMPRESS_CODEC,
+        create_policy(storage), IMAGE_NEAR_DUPLICATE_DISTANCE
+    )
+    while history_manager.loading:
+        time.sleep(0.005)
+    return history_manager
+
+
+def wait_until(app, condition, timeout=30):
+    started = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError("等待超时")
+        app.processEvents()
+        time.sleep(0.0005)
+
+
+class StallMonitor:
+    """用高频定时器检测主线程卡顿：两次触发之间的间隔明显超过定时周期即为卡顿"""
+
+    def __init__(self, interval_ms=5):
+        self.timer = QTimer()
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.tick)
+        self.gaps = []
+        self.last = None
+
+    def start(self):
+        self.last = time.perf_counter()
+        self.timer.start()
+
+    def tick(self):
+        now = time.perf_counter()
+        self.gaps.append((now - self.last) * 1000)
+        self.last = now
+
+    def stop(self):
+        self.timer.stop()
+        return max(self.gaps, default=0.0), sum(1 for g in self.gaps if g > 50)
+
+
+# ---------- 各项测量 ----------
+
+def bench_history(args, directory, items, metrics):
+    """add_item / save / load、format_item_text、内存和磁盘占用"""
+    codec = ImageCodec(IMAGE_FORMAT, PNG_COMPRESS_LEVEL, WEBP_METHOD,
+                       IMAGE_NEAR_DUPLICATE_DISTANCE is not None)
+    encoded = []
+    encode_times = []
+    for item in items:
+        if isinstance(item, str):
+            encoded.append({"type": "text", "data": item})
+        else:
+            started = time.perf_counter()
+            encoded.append(encode_pixels(codec, item.mode, item.size, item.tobytes(), THUMB_SIZE))
+            encode_times.append(ms_since(started))
+    if encode_times:
+        metrics["image_encode_ms"] = statistics.median(encode_times)
+
+    history_manager = create_history_manager(args.backend, directory)
+    add_times = []
+    for item in encoded:
+        started = time.perf_counter()
+        if not isinstance(item, dict):
+            item = history_manager.make_image_entry(*item)
+        history_manager.add_item(item)
+        add_times.append(ms_since(started) * 1000)
+    metrics["add_item_us"] = statistics.mean(add_times)
+    metrics["add_item_p95_us"] = percentile(add_times, 0.95)
+
+    started = time.perf_counter()
+    history_manager.save()
+    metrics["save_full_ms"] = ms_since(started)
+    save_times = []
+    for i in range(args.repeat):
+        history_manager.add_item({"type": "text", "data": f"incremental save {i}"})
+        started = time.perf_counter()
+        history_manager.save()
+        save_times.append(ms_since(started))
+    metrics["save_incremental_ms"] = statistics.median(save_times)
+
+    texts = [e.get("data", "") for e in history_manager.get_copy() if e.get("type") != "image"]
+    if texts:
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            for text in texts:
+                format_item_text(text)
+        metrics["format_item_text_us"] = ms_since(started) * 1000 / (len(texts) * args.repeat)
+
+    first_row, full = [], []
+    for _ in range(args.repeat):
+        loaded = create_history_manager(args.backend, directory)
+        first_row.append(loaded.startup_metrics["time_to_first_row_ms"])
+        full.append(loaded.startup_metrics.get("full_load_ms", first_row[-1]))
+    metrics["load_first_row_ms"] = statistics.median(first_row)
+    metrics["load_full_ms"] = statistics.median(full)
+
+    # 内存单独测一次：tracemalloc 本身会拖慢加载
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    loaded = create_history_manager(args.backend, directory)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    metrics["load_python_bytes"] = used
+    metrics["bytes_per_entry"] = used / max(1, loaded.get_length())
+    # 条目本身的开销：dict 和 __slots__（显示文本在第一次显示时才计算，搜索键只存在索引里）
+    window = loaded.get_copy()
+    metrics["entry_overhead_bytes"] = sum(sys.getsizeof(e) for e in window) / max(1, len(window))
+
+    # SQLite 的 WAL 文件也算在内
+    path = loaded.storage.path
+    metrics["disk_history_bytes"] = sum(
+        os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+    metrics["disk_blob_bytes"] = dir_bytes(os.path.join(directory, "blobs"))
+
+
+def bench_gui(args, app, directory, items, metrics):
+    """界面操作和 采集 -> 列表可见 的端到端延迟"""
+    history_manager = create_history_manager(args.backend, directory)
+    writer = PersistenceThread(history_manager, SAVE_DELAY)
+    history_manager.writer = writer
+    writer.start()
+
+    started = time.perf_counter()
+    gui = ClipboardGUI(history_manager, {
+        "page_size": PAGE_SIZE,
+        "thumb_size": THUMB_SIZE,
+        "pixmap_cache_bytes": PIXMAP_CACHE_BYTES,
+    })
+    metrics["gui_build_ms"] = ms_since(started)
+
+    refresh = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        gui.refresh_listbox()
+        refresh.append(ms_since(started))
+    metrics["refresh_listbox_ms"] = statistics.median(refresh)
+
+    for name, query in QUERIES.items():
+        times, submits = [], []
+        for _ in range(args.repeat):
+            gui.filter_list("")
+            started = time.perf_counter()
+            gui.filter_list(query)
+            submits.append(ms_since(started))
+            # 搜索在后台线程进行，等最终结果送到界面
+            wait_until(app, lambda: not gui.list_model.searching)
+            times.append(ms_since(started))
+        metrics[f"filter_list_{name}_submit_ms"] = statistics.median(submits)
+        metrics[f"filter_list_{name}_ms"] = statistics.median(times)
+    gui.filter_list("")
+
+    source = MemoryClipboardSource()
+    worker = ClipboardWorker(
+        history_manager, 0.05, THUMB_SIZE, source=source,
+        codec=ImageCodec(IMAGE_FORMAT, PNG_COMPRESS_LEVEL, WEBP_METHOD,
+                         IMAGE_NEAR_DUPLICATE_DISTANCE is not None),
+    )
+    worker.start()
+    head = lambda: gui.list_model.entries[0] if gui.list_model.entries else {}
+    images = [item for item in items if not isinstance(item, str)]
+    # 采集用的图片提前生成，生成耗时不计入主线程卡顿
+    rng = random.Random(args.seed)
+    captured = [make_image(rng, images[0].size) for _ in range(min(args.captures, 5))] if images else []
+    monitor = StallMonitor()
+    monitor.start()
+    try:
+        latencies = []
+        for i in range(args.captures):
+            text = f"captured text {i} {time.perf_counter()}"
+            started = time.perf_counter()
+            source.set_text(text)
+            wait_until(app, lambda: head().get("data") == text)
+            latencies.append(ms_since(started))
+        metrics["capture_text_to_visible_ms"] = statistics.median(latencies)
+
+        if images:
+            # 第一张图片要启动编码进程，不计入
+            source.set_image(images[0])
+            wait_until(app, lambda: head().get("type") == "image")
+            latencies = []
+            for image in captured:
+                previous = head().get("blob")
+                started = time.perf_counter()
+                source.set_image(image)
+                wait_until(app, lambda: head().get("type") == "image" and head().get("blob") != previous)
+                latencies.append(ms_since(started))
+            metrics["capture_image_to_visible_ms"] = statistics.median(latencies)
+    finally:
+        metrics["ui_max_stall_ms"], metrics["ui_stalls_over_50ms_count"] = monitor.stop()
+        worker.stop()
+        writer.flush()
+
+
+# ---------- 结果比较 ----------
+
+def compare(metrics, baseline, tolerance):
+    """打印与基线的对比，返回变慢超过容差的指标名"""
+    regressions = []
+    print(f"{'指标':<32}{'基线':>14}{'本次':>14}{'比值':>8}")
+    for name, base in baseline.get("metrics", {}).items():
+        current = metrics.get(name)
+        if current is None:
+            continue
+        ratio = current / base if base else (1.0 if not current else float("inf"))
+        # 不到 1 ms/1 us 的耗时波动只是噪声
+        noise = name.endswith(("_ms", "_us")) and max(base, current) < 1
+        slower = ratio > 1 + tolerance and not noise
+        if slower:
+            regressions.append(name)
+        print(f"{name:<32}{base:>14.2f}{current:>14.2f}{ratio:>7.2f}x{'  <-- 变慢' if slower else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="剪贴板历史无界面基准测试")
+    parser.add_argument("--items", type=int, default=1000, help="合成历史的条数")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("short=0.9,large=0.05,image=0.05"),
+                        help="条目组成，如 short=0.9,large=0.05,image=0.05")
+    parser.add_argument("--large-kb", type=int, default=1024, help="大文本的大小（KB）")
+    parser.add_argument("--image-size", default="3840x2160", help="图片尺寸")
+    parser.add_argument("--backend", choices=("journal", "sqlite"), default="journal")
+    parser.add_argument("--repeat", type=int, default=5, help="每项测量重复次数（取中位数）")
+    parser.add_argument("--captures", type=int, default=20, help="端到端采集延迟的采样次数")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与之比较的基线 JSON 文件")
+    parser.add_argument("--save-baseline", help="把结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许变慢的比例")
+    args = parser.parse_args()
+
+    image_size = tuple(int(x) for x in args.image_size.split("x"))
+    app = QApplication(sys.argv[:1])
+    directory = tempfile.mkdtemp(prefix="clipboard-bench-")
+    metrics = {}
+    try:
+        items = synthetic_items(args.items, args.mix, args.large_kb * 1024, image_size, args.seed)
+        bench_history(args, directory, items, metrics)
+        bench_gui(args, app, directory, items, metrics)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    result = {
+        "params": {
+            "items": args.items, "mix": args.mix, "large_kb": args.large_kb,
+            "image_size": args.image_size, "backend": args.backend, "seed": args.seed,
+        },
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "metrics": metrics,
+    }
+    for name, value in metrics.items():
+        print(f"{name:<32}{value:>14.2f}")
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("params") != result["params"]:
+            print("[ERROR] 基线的测试参数与本次不同，比较结果仅供参考")
+        regressions = compare(metrics, baseline, args.tolerance)
+        if regressions:
+            print(f"[ERROR] {len(regressions)} 项指标变慢超过 {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import struct
+import threading
+import time
+
+
+# 图片格式 -> blob 文件后缀；条目里没有 "format" 时为 PNG
+IMAGE_SUFFIXES = {"png": ".png", "webp": ".webp", "jpeg": ".jpg"}
+
+
+def image_format(data):
+    """根据文件头判断已压缩图片的格式，不认识时返回 None"""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    return None
+
+
+def png_size(data):
+    """从 PNG 的 IHDR 头读取 (宽, 高)，不需要解码整张图"""
+    if len(data) >= 24 and data[:8] == b"\x89PNG\r\n\x1a\n":
+        return struct.unpack(">II", data[16:24])
+    return 0, 0
+
+
+class BlobStore:
+    """按内容哈希寻址的图片存储
+
+    每个 blob 存为 <root>/<前两位>/<sha256><后缀>，同样的内容只存一份。
+    后缀默认为 .png，其他格式的图片由调用方传入对应后缀。
+    历史记录里只保存哈希、大小和尺寸，图片数据按需从磁盘读取。
+    stage() 只把数据放进内存，由持久化线程调用 flush() 真正写盘，
+    这样采集线程不会被磁盘 I/O 阻塞。
+    """
+
+    def __init__(self, root, suffix=".png"):
+        self.root = root
+        self.suffix = suffix
+        self.pending = {}  # 尚未写盘的 blob：哈希 -> (数据, 后缀)
+        self.pending_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def digest(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def path(self, digest, suffix=None):
+        return os.path.join(self.root, digest[:2], digest + (suffix or self.suffix))
+
+    def exists(self, digest, suffix=None):
+        return os.path.exists(self.path(digest, suffix))
+
+    def put(self, data, digest=None, suffix=None):
+        """写入 blob，返回哈希；已存在时只刷新修改时间"""
+        digest = digest or self.digest(data)
+        path = self.path(digest, suffix)
+        if os.path.exists(path):
+            # 刷新 mtime，防止被并发的 gc 当作过期 blob 删除
+            os.utime(path)
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return digest
+
+    def stage(self, data, suffix=None):
+        """暂存 blob 到内存，返回哈希；稍后由 flush() 写盘"""
+        digest = self.digest(data)
+        with self.pending_lock:
+            self.pending.setdefault(digest, (data, suffix))
+        return digest
+
+    def pending_data(self, digest):
+        """尚未写盘的 blob 数据，已写盘时返回 None"""
+        with self.pending_lock:
+            item = self.pending.get(digest)
+        return item[0] if item else None
+
+    def flush(self):
+        """把暂存的 blob 全部写盘"""
+        with self.pending_lock:
+            pending = list(self.pending.items())
+        for digest, (data, suffix) in pending:
+            self.put(data, digest, suffix)
+            with self.pending_lock:
+                self.pending.pop(digest, None)
+
+    def open(self, digest, suffix=None):
+        """以带缓冲的只读文件对象打开 blob（可直接交给 PIL）"""
+        return open(self.path(digest, suffix), 'rb')
+
+    def read(self, digest, suffix=None):
+        """读取 blob 全部内容，不存在时返回 None"""
+        data = self.pending_data(digest)
+        if data is not None:
+            return data
+        try:
+            with self.open(digest, suffix) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def gc(self, live_digests, older_than=None):
+        """删除不再被引用的 blob
+
+        older_than: 只删除修改时间早于该时间戳的文件，
+        避免误删刚写入、还没来得及加入历史记录的 blob。
+        """
+        if older_than is None:
+            older_than = time.time()
+        removed = 0
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                digest, suffix = os.path.splitext(name)
+                if suffix != self.suffix and suffix not in IMAGE_SUFFIXES.values():
+                    continue
+                if digest in live_digests:
+                    continue
+                path = os.path.join(shard_dir, name)
+                try:
+                    if os.path.getmtime(path) < older_than:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
@@ -0,0 +1,174 @@
+"""剪贴板历史命令行客户端（需要先运行 python main.py --daemon）
+
+    python cli.py list -n 20              # 最新的 20 条
+    python cli.py search 关键词            # 模糊搜索
+    python cli.py get 0 > clip.txt        # 输出第 0 条的完整内容，图片用 -o 保存到文件
+    python cli.py watch                   # 持续打印新的变化
+    echo hello | python cli.py add        # 从标准输入添加一条文本
+    python cli.py export out.ndjson --sidecar   # 导出（图片另存到 out.ndjson.blobs/）
+    python cli.py import out.ndjson
+    python cli.py delete 关键词 / pin 关键词 [--unpin]   # 批量删除 / 固定包含关键词的条目
+"""
+import argparse
+import os
+import sys
+import time
+from multiprocessing import AuthenticationError
+
+from config import IPC_ADDRESS, IPC_AUTHKEY_FILE
+from history_service import RemoteHistory, default_address, read_authkey
+
+
+def summary(entry, width=60):
+    """条目的单行摘要"""
+    if entry.get("type") == "image":
+        return f"[图片] {entry.get('width', '?')}x{entry.get('height', '?')}"
+    text = " ".join(entry.get("data", "").split())
+    if entry.get("type") == "files":
+        text = "[文件] " + text
+    return text if len(text) <= width else text[:width - 1] + "…"
+
+
+def print_entries(entries, offset=0):
+    for i, entry in enumerate(entries, offset):
+        pin = "*" if entry.get("pinned") else " "
+        print(f"{i:>5}{pin} {summary(entry)}")
+
+
+def cmd_list(remote, args):
+    print_entries(remote.get_page(args.offset, args.limit), args.offset)
+
+
+def cmd_search(remote, args):
+    query = " ".join(args.query)
+    results = remote.fuzzy_search(query, args.limit) if not args.exact else remote.search(query, args.limit)
+    print_entries(results)
+
+
+def cmd_get(remote, args):
+    entries = remote.get_page(args.index, 1)
+    if not entries:
+        print(f"[ERROR] 没有第 {args.index} 条")
+        return 1
+    entry = remote.get_full(entries[0])
+    if entry.get("type") == "image":
+        data = remote.read_image(entry)
+        if data is None:
+            print("[ERROR] 图片数据不存在")
+            return 1
+        if not args.output:
+            print(f"图片条目，用 -o 指定保存路径（{remote.image_suffix(entry)}）")
+            return 1
+        with open(args.output, "wb") as f:
+            f.write(data)
+        return 0
+    sys.stdout.write(entry.get("data", ""))
+    return 0
+
+
+def cmd_watch(remote, args):
+    def on_event(event):
+        name = type(event).__name__
+        entries = getattr(event, "entries", None) or [getattr(event, "entry", None)]
+        detail = "; ".join(summary(e) for e in entries if e)
+        print(f"[{event.version}] {name} {detail}", flush=True)
+
+    remote.subscribe(on_event)
+    done = []
+    remote.on_command(lambda command, value: command == "closed" and done.append(True))
+    try:
+        while not done:
+            # 订阅在后台线程读取，这里只等待中断或断开
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+
+
+def cmd_add(remote, args):
+    text = " ".join(args.text) if args.text else sys.stdin.read()
+    if not text:
+        return 1
+    remote.add_item({"type": "text", "data": text})
+    return 0
+
+
+def cmd_export(remote, args):
+    images = "sidecar" if args.sidecar else "inline"
+    count = remote.call("export", os.path.abspath(args.path), args.query, images)
+    print(f"已导出 {count} 条")
+
+
+def cmd_import(remote, args):
+    added, skipped = remote.call("import", os.path.abspath(args.path))
+    print(f"已导入 {added} 条，跳过 {skipped} 条")
+
+
+def cmd_delete(remote, args):
+    print(f"已删除 {remote.call('delete', ' '.join(args.query))} 条")
+
+
+def cmd_pin(remote, args):
+    count = remote.call("pin", " ".join(args.query), not args.unpin)
+    print(f"已{'取消固定' if args.unpin else '固定'} {count} 条")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="剪贴板历史命令行客户端")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("list", help="列出最新的条目")
+    p.add_argument("-n", "--limit", type=int, default=20)
+    p.add_argument("--offset", type=int, default=0)
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser("search", help="搜索（默认模糊匹配）")
+    p.add_argument("query", nargs="+")
+    p.add_argument("-n", "--limit", type=int, default=20)
+    p.add_argument("--exact", action="store_true", help="子串匹配")
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser("get", help="输出第 INDEX 条的完整内容")
+    p.add_argument("index", type=int)
+    p.add_argument("-o", "--output", help="图片保存路径")
+    p.set_defaults(func=cmd_get)
+
+    p = sub.add_parser("watch", help="持续打印历史变化")
+    p.set_defaults(func=cmd_watch)
+
+    p = sub.add_parser("add", help="添加一条文本（不写系统剪贴板）")
+    p.add_argument("text", nargs="*")
+    p.set_defaults(func=cmd_add)
+
+    p = sub.add_parser("export", help="导出为 NDJSON")
+    p.add_argument("path")
+    p.add_argument("-q", "--query", help="只导出包含该文本的条目")
+    p.add_argument("--sidecar", action="store_true", help="图片另存为文件而不是写进 NDJSON")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("import", help="从 NDJSON 导入")
+    p.add_argument("path")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("delete", help="删除包含该文本的全部条目")
+    p.add_argument("query", nargs="+")
+    p.set_defaults(func=cmd_delete)
+
+    p = sub.add_parser("pin", help="固定包含该文本的全部条目")
+    p.add_argument("query", nargs="+")
+    p.add_argument("--unpin", action="store_true", help="取消固定")
+    p.set_defaults(func=cmd_pin)
+
+    args = parser.parse_args()
+    try:
+        remote = RemoteHistory(IPC_ADDRESS or default_address(), read_authkey(IPC_AUTHKEY_FILE))
+    except (OSError, EOFError, AuthenticationError) as e:
+        print(f"[ERROR] 无法连接采集进程（先运行 python main.py --daemon）: {e}")
+        return 1
+    try:
+        return args.func(remote, args) or 0
+    finally:
+        remote.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
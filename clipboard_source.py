@@ -0,0 +1,233 @@
+import io
+import os
+import threading
+import time
+
+from image_codec import IMAGE_FILE_SUFFIXES
+
+try:
+    import win32clipboard
+    from base import get_clipboard_formats
+    HAS_WIN32 = True
+except ImportError:
+    HAS_WIN32 = False
+
+# 需要用到的 Windows 剪贴板标准格式（与 base.STANDARD_FORMATS 一致）
+CF_TEXT = 1
+CF_DIB = 8
+CF_UNICODETEXT = 13
+CF_HDROP = 15
+CF_DIBV5 = 17
+
+
+def plan_capture(formats):
+    """根据剪贴板里已有的格式决定只读取哪一种，返回 (类型, 格式)，没有要保存的内容时返回 None
+
+    优先级与以前一致：复制的文件 > 图片 > 文本。
+    图片优先用 CF_DIB（与 PIL ImageGrab 相同），只有 CF_DIBV5 时才用它。
+    """
+    if CF_HDROP in formats:
+        return "files", CF_HDROP
+    for fmt in (CF_DIB, CF_DIBV5):
+        if fmt in formats:
+            return "image", fmt
+    for fmt in (CF_UNICODETEXT, CF_TEXT):
+        if fmt in formats:
+            return "text", fmt
+    return None
+
+
+def is_image_file(path):
+    return os.path.splitext(path)[1].lower() in IMAGE_FILE_SUFFIXES
+
+
+def dib_to_image(data):
+    """CF_DIB/CF_DIBV5 数据（不带 BMP 文件头）-> PIL 图片"""
+    from PIL import BmpImagePlugin
+
+    return BmpImagePlugin.DibImageFile(io.BytesIO(data))
+
+
+def clipboard_data_size(fmt):
+    """不复制数据，读取剪贴板中某个格式的字节数（剪贴板需已打开），无法得知时返回 None"""
+    import ctypes
+
+    try:
+        handle = win32clipboard.GetClipboardDataHandle(fmt)
+    except Exception:
+        return None
+    kernel32 = ctypes.windll.kernel32
+    kernel32.GlobalSize.restype = ctypes.c_size_t
+    kernel32.GlobalSize.argtypes = [ctypes.c_void_p]
+    return kernel32.GlobalSize(handle) or None
+
+
+class ClipboardSource:
+    """剪贴板数据源
+
+    wait_for_change() 负责廉价地判断剪贴板是否变化，
+    只有变化后 ClipboardWorker 才会调用 read() 读取内容。
+    """
+
+    last_sequence = None  # 上次报告变化时的序列号
+
+    def wait_for_change(self, timeout):
+        """最多等待 timeout 秒，剪贴板自上次调用后有变化时返回 True"""
+        raise NotImplementedError
+
+    def invalidate(self):
+        """读取失败时调用，下次 wait_for_change() 会重新报告变化"""
+        self.last_sequence = None
+
+    def read(self):
+        """读取要保存的内容，返回 (类型, 内容)，没有可保存的内容时返回 None
+
+            ("file", 路径)       复制的是单个图片文件，原样保存文件数据
+            ("files", [路径])    复制的其他文件，只保存路径
+            ("image", PIL 图片)
+            ("text", str)
+        默认实现依次调用 get_files()/get_image()/get_text()。
+        """
+        files = self.get_files()
+        if files:
+            if len(files) == 1 and is_image_file(files[0]):
+                return "file", files[0]
+            return "files", files
+        image = self.get_image()
+        if image:
+            return "image", image
+        text = self.get_text()
+        if isinstance(text, str):
+            return "text", text
+        return None
+
+    def get_files(self):
+        """剪贴板里复制的文件路径列表，没有则返回 None"""
+        return None
+
+    def get_image(self):
+        """返回剪贴板中的 PIL 图片，没有则返回 None"""
+        return None
+
+    def get_text(self):
+        """返回剪贴板中的文本，没有则返回 None"""
+        return None
+
+    def close(self):
+        pass
+
+
+class Win32ClipboardSource(ClipboardSource):
+    """通过 GetClipboardSequenceNumber 检测变化
+
+    序列号每次剪贴板内容变化都会加一，读取它不需要打开剪贴板，
+    所以空闲时每次轮询只是一次系统调用，不再抓取和编码图片。
+    变化后先枚举一次格式（一次打开/关闭），由 plan_capture() 决定只读取哪个格式，
+    读取前先查询数据大小，超过上限的内容直接跳过，不复制到进程里。
+
+    max_text_bytes/max_image_bytes: 文本（UTF-16）和图片（DIB 或图片文件）的字节数上限，None 表示不限
+    """
+
+    def __init__(self, max_text_bytes=None, max_image_bytes=None):
+        self.max_text_bytes = max_text_bytes
+        self.max_image_bytes = max_image_bytes
+
+    def wait_for_change(self, timeout):
+        time.sleep(timeout)
+        sequence = win32clipboard.GetClipboardSequenceNumber()
+        if sequence == self.last_sequence:
+            return False
+        self.last_sequence = sequence
+        return True
+
+    def read(self):
+        plan = plan_capture(set(get_clipboard_formats()))
+        if plan is None:
+            return None
+        kind, fmt = plan
+        limit = {"image": self.max_image_bytes, "text": self.max_text_bytes}.get(kind)
+
+        win32clipboard.OpenClipboard()
+        try:
+            size = clipboard_data_size(fmt) if limit else None
+            if size is not None and size > limit:
+                print(f"剪贴板内容过大（{size // 1024} KB），跳过")
+                return None
+            data = win32clipboard.GetClipboardData(fmt)
+        finally:
+            win32clipboard.CloseClipboard()
+
+        if kind == "files":
+            files = list(data)
+            if len(files) == 1 and is_image_file(files[0]):
+                if self.max_image_bytes and os.path.getsize(files[0]) > self.max_image_bytes:
+                    print(f"图片文件过大，跳过: {files[0]}")
+                    return None
+                return "file", files[0]
+            return ("files", files) if files else None
+        if kind == "image":
+            return "image", dib_to_image(data)
+        if isinstance(data, bytes):
+            data = data.decode("mbcs", errors="replace")  # CF_TEXT
+        return "text", data
+
+
+class MemoryClipboardSource(ClipboardSource):
+    """内存中的假剪贴板，用于在非 Windows 环境下测试和跑基准
+
+    set_text()/set_image()/set_file()/set_files() 会立即唤醒等待中的 wait_for_change()。
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.last_sequence = None
+        self.text = None
+        self.image = None
+        self.files = None
+        self.closed = False
+
+    def set_content(self, text=None, image=None, files=None):
+        with self.condition:
+            self.text, self.image, self.files = text, image, files
+            self.sequence += 1
+            self.condition.notify_all()
+
+    def set_text(self, text):
+        self.set_content(text=text)
+
+    def set_image(self, image):
+        self.set_content(image=image)
+
+    def set_file(self, path):
+        self.set_content(files=[path])
+
+    def set_files(self, paths):
+        self.set_content(files=list(paths))
+
+    def wait_for_change(self, timeout):
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.closed or self.sequence != self.last_sequence, timeout)
+            if self.sequence == self.last_sequence:
+                return False
+            self.last_sequence = self.sequence
+            return True
+
+    def get_files(self):
+        with self.condition:
+            return self.files
+
+    def get_image(self):
+        with self.condition:
+            return self.image
+
+    def get_text(self):
+        with self.condition:
+            return self.text
+
+    def close(self):
+        # 唤醒等待中的线程，让 ClipboardWorker 能及时退出
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
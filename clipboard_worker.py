@@ -1,58 +1,137 @@
-import time
+import hashlib
+import os
 import threading
-import base64
-import pyperclip
-import win32clipboard
-from PIL import ImageGrab
-import io
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from blob_store import image_format
+from clipboard_source import Win32ClipboardSource
+from image_codec import ImageCodec, encode_pixels, encode_file
+from metrics import METRICS
 
 class ClipboardWorker(threading.Thread):
-    def __init__(self, history_manager, poll_interval, daemon=True):
+    """采集线程
+
+    图片按 采集原始像素 -> 进程池编码 -> 入库 三个阶段处理：
+    采集线程只复制像素就返回，PNG/WebP 编码和缩略图在子进程中完成，不占用 GIL；
+    编码结果按采集顺序依次加入历史。
+    """
+
+    def __init__(self, history_manager, poll_interval, thumb_size=(128, 100), source=None,
+                 daemon=True, codec=None, executor=None, encode_workers=1):
         super().__init__(daemon=daemon)
         self.history_manager = history_manager
         self.poll_interval = poll_interval
+        self.thumb_size = thumb_size
+        # 只有 source 报告剪贴板变化时才读取内容
+        self.source = source or Win32ClipboardSource()
+        self.codec = codec or ImageCodec()
+        self.executor = executor  # 为 None 时在第一次遇到图片时创建进程池
+        self.encode_workers = encode_workers
         self.running = True
-        self.last_data = None
-
-    def get_clipboard_image(self):
-        """尝试读取剪贴板里的图片，返回 base64 编码 PNG"""
-        try:
-            img = ImageGrab.grabclipboard()
-            if img:
-                buf = io.BytesIO()
-                img.save(buf, format="PNG")
-                return base64.b64encode(buf.getvalue()).decode("utf-8")
-        except Exception as e:
-            print(f"[ERROR] 读取图片失败: {e}")
-        return None
+        self.last_key = None  # 上次采集内容的标识，剪贴板内容没变时不再重复处理
+        self.inflight = deque()  # 按采集顺序排队、尚未入库的 Future
+        self.inflight_lock = threading.Lock()
 
-    def run(self):
-        """后台轮询剪贴板"""
-        while self.running:
+    def get_executor(self):
+        if self.executor is None:
             try:
-                entry = None
+                self.executor = ProcessPoolExecutor(max_workers=self.encode_workers)
+            except (OSError, NotImplementedError) as e:
+                print(f"[ERROR] 无法创建编码进程池，改用线程: {e}")
+                self.executor = ThreadPoolExecutor(max_workers=self.encode_workers)
+        return self.executor
 
-                # 先检测是否是图片
-                image_data = self.get_clipboard_image()
-                if image_data:
-                    entry = {"type": "image", "data": image_data}
+    def submit_image(self, img):
+        """复制原始像素并提交编码，返回 Future；与上次相同的图片返回 None"""
+        if img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGBA")
+        pixels = img.tobytes()
+        # hashlib 处理大块数据时会释放 GIL
+        key = ("image", hashlib.blake2b(pixels, digest_size=16).digest())
+        if key == self.last_key:
+            return None
+        self.last_key = key
+        return self.get_executor().submit(
+            encode_pixels, self.codec, img.mode, img.size, pixels, self.thumb_size
+        )
 
-                else:
-                    # 否则检查文本
-                    text = pyperclip.paste()
-                    if isinstance(text, str) and text.strip():
-                        entry = {"type": "text", "data": text}
-
-                if entry and entry != self.last_data:
-                    if self.history_manager.add_item(entry):
-                        self.history_manager.save()
-                    self.last_data = entry
+    def submit_file(self, path):
+        """复制的是图片文件时原样保存已压缩的数据，不重新编码"""
+        stat = os.stat(path)
+        key = ("file", path, stat.st_size, stat.st_mtime_ns)
+        if key == self.last_key:
+            return None
+        with open(path, 'rb') as f:
+            data = f.read()
+        if image_format(data) is None:
+            return None
+        self.last_key = key
+        return self.get_executor().submit(encode_file, data, self.thumb_size, self.codec.perceptual_hash)
 
+    def run(self):
+        """后台等待剪贴板变化"""
+        while self.running:
+            try:
+                if self.source.wait_for_change(self.poll_interval):
+                    METRICS.incr("worker.changes")
+                    with METRICS.timer("worker.capture"):
+                        self.capture()
             except Exception as e:
+                METRICS.incr("worker.errors")
                 print(f"[ERROR] 剪贴板读取失败: {e}")
+                # 剪贴板可能正被其他程序占用，下一轮重试
+                self.source.invalidate()
+
+    def capture(self):
+        """读取剪贴板当前内容，排队等待加入历史"""
+        job = None
+
+        # 数据源只读取会被保存的那一种格式
+        content = self.source.read()
+        kind, value = content if content else (None, None)
+        if kind == "file":
+            job = self.submit_file(value)
+        elif kind == "image":
+            job = self.submit_image(value)
+        elif kind in ("files", "text"):
+            # 复制的文件只保存路径（每行一个）
+            text = "\n".join(value) if kind == "files" else value
+            if text.strip() and (kind, text) != self.last_key:
+                self.last_key = (kind, text)
+                job = Future()
+                job.set_result({"type": kind, "data": text})
+
+        if job is not None:
+            job.captured = time.perf_counter()
+            with self.inflight_lock:
+                self.inflight.append(job)
+            # 已完成的 Future 会在当前线程立即回调，所以不能在持锁时注册
+            job.add_done_callback(self.drain)
 
-            time.sleep(self.poll_interval)
+    def drain(self, _=None):
+        """按采集顺序把已完成的条目加入历史（在完成编码的回调线程中运行）"""
+        with self.inflight_lock:
+            while self.inflight and self.inflight[0].done():
+                job = self.inflight.popleft()
+                try:
+                    result = job.result()
+                    if not isinstance(result, dict):
+                        result = self.history_manager.make_image_entry(*result)
+                except Exception as e:
+                    METRICS.incr("worker.encode_errors")
+                    print(f"[ERROR] 图片编码失败: {e}")
+                    continue
+                if self.history_manager.add_item(result):
+                    self.history_manager.request_save()
+                # 从读取剪贴板到加入历史（图片包含排队和编码）
+                METRICS.observe(f"worker.{result.get('type', 'text')}_to_history",
+                                (time.perf_counter() - job.captured) * 1000)
 
     def stop(self):
-        """停止工作线程"""
-        self.running = False
\ No newline at end of file
+        """停止工作线程，等待已采集的图片编码完成并入库"""
+        self.running = False
+        self.source.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
@@ -1,9 +1,44 @@
 # 配置与常量定义
-MAX_ITEMS = 200           # 历史最大条数
+MAX_ITEMS = 200           # 内存中保留的最近条数（journal 后端的历史上限）
 POLL_INTERVAL = 0.25     # 剪贴板轮询间隔（秒）
-QUEUE_POLL_MS = 100      # Tk after 轮询队列间隔（毫秒）
-HISTORY_FILE = "clipboard_history.json"  # 历史记录文件
+CAPTURE_MAX_TEXT_BYTES = 64 * 1024 * 1024  # 超过该大小（UTF-16 字节）的文本不保存，读取前先查询大小
+CAPTURE_MAX_IMAGE_BYTES = 512 * 1024 * 1024  # 超过该大小的图片（DIB 或图片文件）不保存
+STORAGE_BACKEND = "journal"  # 存储后端："journal"（追加写日志）或 "sqlite"
+HISTORY_FILE = "clipboard_history.jsonl"  # 历史记录日志（追加写）
+SQLITE_FILE = "clipboard_history.db"  # SQLite 后端数据库文件
+SQLITE_MAX_ITEMS = 100000  # SQLite 后端保留的最大条数
+# 淘汰策略：按类型的字节预算（None 表示不限），固定的条目不会被淘汰
+MEMORY_BUDGET = {"text": 32 * 1024 * 1024, "image": None}  # 内存窗口（图片解码后的内存由 PIXMAP_CACHE_BYTES 限制）
+DISK_BUDGET = {"text": 256 * 1024 * 1024, "image": 2 * 1024 * 1024 * 1024}  # 磁盘上保存的历史
+MAX_AGE_DAYS = None  # 条目最长保留天数（从最近一次复制算起），None 表示不限
+PAGE_SIZE = 100  # 列表每次加载的条数，滚动到底部时继续加载
+THUMB_SIZE = (128, 100)  # 列表缩略图尺寸，采集时生成
+IMAGE_FORMAT = "png"  # 图片保存格式："png" 或 "webp"（无损）
+PNG_COMPRESS_LEVEL = 6  # PNG 压缩级别 0-9，越小编码越快、文件越大
+WEBP_METHOD = 4  # 无损 WebP 压缩方法 0-6，越小编码越快、文件越大
+IMAGE_ENCODE_WORKERS = 1  # 图片编码进程数，编码不在采集线程中进行
+IMAGE_NEAR_DUPLICATE_DISTANCE = None  # 新截图与已有同尺寸图片的感知哈希（256 位）相差不超过这么多位时替换旧图，如 4；None 关闭（文字截图里改一行也可能相差 0 位）
+PIXMAP_CACHE_BYTES = 64 * 1024 * 1024  # 缩略图/预览图 LRU 缓存上限（字节）
+PASTE_CACHE_BYTES = 128 * 1024 * 1024  # 图片粘贴数据（CF_DIB/QImage，未压缩）缓存上限（字节）
+PASTE_PREWARM_RECENT = 2  # 后台预先准备粘贴数据的最新图片张数，选中的图片总会预热
+PASTE_DELAYED_RENDERING = True  # 未预热的图片延迟渲染：目标程序读取剪贴板时才解码
+SEARCH_INDEX_MAX_CHARS = 4096  # 每条文本建立 trigram 索引的最大长度，超出部分在确认阶段检查；模糊匹配也只看这么长
+SEARCH_RECENCY_WEIGHT = 16  # 模糊搜索排序中新近度的加分上限（匹配每个字符约 16 分）
+SEARCH_FREQUENCY_WEIGHT = 8  # 模糊搜索排序中复制次数的加分（每翻一倍加这么多）
+TEXT_COMPRESS_THRESHOLD = 64 * 1024  # 超过该字符数的文本压缩保存（内存和磁盘），0 表示不压缩
+TEXT_COMPRESS_PREFIX_CHARS = 4096  # 压缩文本保留的明文前缀长度，用于列表显示和搜索
+TEXT_COMPRESS_CODEC = "zlib"  # 文本压缩算法："zlib" 或 "lzma"（更小但更慢）
+LEGACY_HISTORY_FILE = "clipboard_history.json"  # 旧版整文件 JSON，首次启动时迁移
+BLOB_DIR = "clipboard_blobs"  # 图片按内容哈希存放的目录
+SAVE_DELAY = 1.0  # 持久化合并窗口（秒）：窗口内的多次变更只写一次盘
+JOURNAL_COMPACT_THRESHOLD = 500  # 日志记录数超过该值（且超过存活条目两倍）时后台压缩
+JOURNAL_LAZY_BYTES = 4096  # 超过该大小的条目启动时只读元数据和预览，正文在后台加载
 HOTKEY = "ctrl+shift+c"  # 全局热键
+IPC_ADDRESS = None  # --daemon 的 IPC 地址，None 为默认的命名管道（Windows）或临时目录中的 Unix 域套接字
+IPC_AUTHKEY_FILE = "clipboard_ipc.key"  # --daemon 启动时生成的连接密钥，客户端读取它来连接
+METRICS_PORT = 8765  # --metrics 时在 127.0.0.1 的该端口提供 GET /metrics（JSON），0 表示不开启
+METRICS_DUMP_FILE = "clipboard_metrics.json"  # --metrics 时退出前写入最终的统计快照
+MOUSE_TRACKING = False  # 鼠标点击时记录前台窗口（用于粘贴时切回），开启后才加载 pynput
 WINDOW_TITLE = "剪切板历史"  # 窗口标题
 WINDOW_SIZE = "520x560"  # 窗口大小
 FONT_SETTING = ("Arial", 12)  # 列表字体设置
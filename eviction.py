@@ -0,0 +1,49 @@
+def entry_kind(entry):
+    """预算按类型分开计算：图片或文本"""
+    return "image" if entry.get("type") == "image" else "text"
+
+
+def entry_bytes(entry):
+    """条目占用的字节数（估算）：图片按 blob 大小，文本按正文和压缩数据的长度"""
+    if entry.get("type") == "image":
+        return entry.get("size") or 0
+    return len(entry.get("data", "")) + len(entry.get("payload", ""))
+
+
+class EvictionPolicy:
+    """淘汰策略：条数上限、按类型的字节预算和最长保留时间
+
+    max_items: 条数上限，None 表示不限
+    byte_limits: {"text": 字节, "image": 字节}，缺省或 None 表示该类型不限
+    max_age: 最长保留秒数（从最近一次复制算起），None 表示不限
+    固定（"pinned"）的条目不受淘汰策略影响，由调用方跳过。
+    """
+
+    def __init__(self, max_items=None, byte_limits=None, max_age=None):
+        self.max_items = max_items
+        self.byte_limits = {k: v for k, v in (byte_limits or {}).items() if v}
+        self.max_age = max_age
+
+    def count_over(self, count):
+        return self.max_items is not None and count > self.max_items
+
+    def over_kinds(self, used):
+        """used: {类型: 已用字节}，返回超出预算的类型集合"""
+        return {k for k, limit in self.byte_limits.items() if used.get(k, 0) > limit}
+
+    def expired(self, entry, now):
+        if not self.max_age or entry.get("time") is None:
+            return False
+        return entry["time"] < now - self.max_age
+
+    def combined(self, other):
+        """两个策略同时生效时的等效策略（各项取更严格的一方）"""
+        def stricter(a, b):
+            return b if a is None else a if b is None else min(a, b)
+
+        kinds = set(self.byte_limits) | set(other.byte_limits)
+        return EvictionPolicy(
+            stricter(self.max_items, other.max_items),
+            {k: stricter(self.byte_limits.get(k), other.byte_limits.get(k)) for k in kinds},
+            stricter(self.max_age, other.max_age),
+        )
@@ -0,0 +1,177 @@
+import heapq
+import math
+import threading
+import time
+
+from metrics import METRICS
+
+# 打分规则（参考 fzf）：每个匹配字符得分，词首和连续匹配加分，中间的空隙扣分
+SCORE_MATCH = 16
+BONUS_BOUNDARY = 8      # 匹配在词首（开头或前一个字符不是字母数字）
+BONUS_FIRST_CHAR = 8    # 查询的第一个字符落在词首时再加一次
+BONUS_CONSECUTIVE = 4   # 与上一个匹配字符相邻
+PENALTY_GAP_START = 3
+PENALTY_GAP_EXTENSION = 1
+MAX_GAP_PENALTY = 24    # 单个空隙最多扣的分，避免长文本里的远距离匹配得分为负无穷
+
+
+def fuzzy_positions(term, key, limit):
+    """term 在 key 中的匹配位置，不匹配返回 None
+
+    优先整段子串匹配（全文）；否则在 key[:limit] 中找按顺序出现的各字符：
+    先正向找到最早的结束位置，再反向收缩出最短的匹配窗口。
+    查找都用 str.find/rfind 在 C 层完成，Python 循环次数只与 term 长度有关。
+    """
+    start = key.find(term)
+    if start >= 0:
+        return range(start, start + len(term))
+
+    p = -1
+    for c in term:
+        p = key.find(c, p + 1, limit)
+        if p < 0:
+            return None
+    p += 1
+    for c in reversed(term):
+        p = key.rfind(c, 0, p)
+    positions = []
+    p -= 1
+    for c in term:
+        p = key.find(c, p + 1, limit)
+        positions.append(p)
+    return positions
+
+
+def score_positions(key, positions):
+    score = 0
+    prev = None
+    for p in positions:
+        score += SCORE_MATCH
+        if p == 0 or not key[p - 1].isalnum():
+            score += BONUS_BOUNDARY
+            if prev is None:
+                score += BONUS_FIRST_CHAR
+        if prev is not None:
+            gap = p - prev - 1
+            if gap == 0:
+                score += BONUS_CONSECUTIVE
+            else:
+                score -= min(MAX_GAP_PENALTY, PENALTY_GAP_START + PENALTY_GAP_EXTENSION * (gap - 1))
+        prev = p
+    return score
+
+
+def fuzzy_score(terms, key, limit):
+    """多个词（空格分隔）都要匹配，得分相加；任一词不匹配返回 None"""
+    total = 0
+    for term in terms:
+        positions = fuzzy_positions(term, key, limit)
+        if positions is None:
+            return None
+        total += score_positions(key, positions)
+    return total
+
+
+class FuzzySearcher(threading.Thread):
+    """后台模糊搜索线程
+
+    submit() 提交新查询时，正在进行的旧查询在下一批候选处放弃。
+    候选按时间倒序逐批打分，用大小为 limit 的小顶堆只保留得分最高的条目；
+    每隔 stream_ms 通过 callback(results, done) 送出当前的前 limit 条，最后再送一次完整结果。
+    callback 在搜索线程中调用，调用方负责转到 GUI 线程。
+
+    排序得分 = 匹配得分 + 新近度加分（越新越高）+ 复制次数加分（按次数取对数）。
+    """
+
+    def __init__(self, history_manager, limit=100, max_chars=4096, recency_weight=16,
+                 frequency_weight=8, batch=500, stream_ms=50, daemon=True):
+        super().__init__(daemon=daemon)
+        self.history_manager = history_manager
+        self.limit = limit
+        self.max_chars = max_chars
+        self.recency_weight = recency_weight
+        self.frequency_weight = frequency_weight
+        self.batch = batch
+        self.stream_ms = stream_ms
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.request = None  # (generation, 查询, callback)
+        self.running = True
+
+    def submit(self, query, callback):
+        with self.condition:
+            self.generation += 1
+            self.request = (self.generation, query, callback)
+            self.condition.notify()
+
+    def cancel(self):
+        with self.condition:
+            self.generation += 1
+            self.request = None
+
+    def stop(self):
+        self.running = False
+        self.cancel()
+        with self.condition:
+            self.condition.notify()
+
+    def cancelled(self, generation):
+        return generation != self.generation or not self.running
+
+    def run(self):
+        while self.running:
+            with self.condition:
+                while self.request is None and self.running:
+                    self.condition.wait()
+                request, self.request = self.request, None
+            if request is None:
+                continue
+            generation, query, callback = request
+            started = time.perf_counter()
+            try:
+                results = self.search(query, lambda: self.cancelled(generation),
+                                      lambda partial: callback(partial, False))
+            except Exception as e:
+                print(f"[ERROR] 搜索失败: {e}")
+                results = []
+            if results is None:
+                METRICS.incr("search.cancelled")
+                continue
+            METRICS.observe("search.fuzzy", (time.perf_counter() - started) * 1000)
+            callback(results, True)
+
+    def search(self, query, cancelled=lambda: False, on_partial=None):
+        """在当前线程搜索，返回按得分排序的结果；cancelled() 为真时放弃并返回 None
+
+        on_partial(results): 每隔 stream_ms 调用一次，送出当前的前 limit 条。
+        """
+        terms = query.lower().split()
+        heap = []  # (排序得分, -序号, 条目)，堆顶是当前第 limit 名
+        last_stream = time.perf_counter()
+        rank = 0
+        for batch in self.history_manager.search_candidates(terms, self.batch):
+            if cancelled():
+                return None
+            for entry, key in batch:
+                score = fuzzy_score(terms, key, self.max_chars)
+                if score is not None:
+                    score += self.recency_weight * 100 / (100 + rank)
+                    copies = entry.get("copies", 1) if isinstance(entry, dict) else 1
+                    score += self.frequency_weight * math.log2(max(1, copies))
+                    item = (score, -rank, entry)
+                    if len(heap) < self.limit:
+                        heapq.heappush(heap, item)
+                    elif item[:2] > heap[0][:2]:
+                        heapq.heapreplace(heap, item)
+                rank += 1
+            now = time.perf_counter()
+            if on_partial and heap and (now - last_stream) * 1000 >= self.stream_ms:
+                on_partial(self.ranked(heap))
+                last_stream = now
+        if cancelled():
+            return None
+        return self.ranked(heap)
+
+    @staticmethod
+    def ranked(heap):
+        return [entry for _, _, entry in sorted(heap, key=lambda item: item[:2], reverse=True)]
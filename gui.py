@@ -1,55 +1,60 @@
 import sys
-import time
 import threading
-import pyperclip
-import keyboard
-import base64
-import pythoncom
-from pynput.mouse import Listener  # 新增导入
-
-try:
-    import win32clipboard
-    import win32con
-    from PIL import Image
-    import io
-    WIN32_AVAILABLE = True
-except ImportError:
-    WIN32_AVAILABLE = False
+import importlib.util
+
+# keyboard/pythoncom/pynput/win32clipboard/PIL 都在第一次用到时才导入，
+# 这里只检查是否安装，不拖慢启动
+WIN32_AVAILABLE = (importlib.util.find_spec("win32clipboard") is not None
+                   and importlib.util.find_spec("PIL") is not None)
+if not WIN32_AVAILABLE:
     print("win32clipboard 不可用，将使用Qt剪贴板")
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QLineEdit, QListWidget, QListWidgetItem,
-    QPushButton, QLabel, QMessageBox, QTextEdit, QSplitter, QStackedWidget
+    QLineEdit, QListView,
+    QPushButton, QLabel, QMessageBox, QTextEdit, QSplitter, QStackedWidget, QMenu
 )
-from PyQt6.QtGui import QPixmap, QIcon
-from PyQt6.QtCore import Qt, QTimer, QSize, pyqtSignal
+from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtCore import Qt, QTimer, QSize, QMimeData, QUrl, pyqtSignal
 
 from window_manager import activate_window
+from history_model import HistoryListModel, HistoryItemDelegate
+from history_entry import format_item_text
+from pixmap_cache import PixmapCache
+from history_events import Inserted, Moved, Cleared, Reset
+from paste_controller import PasteController
+from paste_cache import PasteCache, DelayedImageMimeData
+from preview_loader import PreviewLoader
+from fuzzy_search import FuzzySearcher
+from metrics import METRICS
 
 
 class ClipboardGUI(QMainWindow):
     # 添加自定义信号用于线程间通信
     paste_signal = pyqtSignal(object)
+    history_event = pyqtSignal(object)  # HistoryManager 的变化事件，排队送到主线程
+    show_requested = pyqtSignal()  # 热键线程请求显示窗口
+    exit_requested = pyqtSignal()  # 其他线程请求退出（如与采集进程断开）
     
     def __init__(self, history_manager, config):
         super().__init__()
-        # 主线程中初始化COM环境
-        try:
-            pythoncom.CoInitializeEx(pythoncom.COINIT_APARTMENTTHREADED)
-        except:
-            pythoncom.CoInitialize()
-            
         self.history_manager = history_manager
         self.config = config
-        self.cmd_queue = config.get("cmd_queue")
+        self.page_size = config.get("page_size", 100)
+        self.thumb_size = config.get("thumb_size", (128, 100))
+        # 列表缩略图和预览图共用的 LRU 缓存
+        self.pixmap_cache = PixmapCache(config.get("pixmap_cache_bytes", 64 * 1024 * 1024))
+        # 图片粘贴用的现成数据，有 Windows API 时缓存 CF_DIB，否则缓存 QImage
+        self.paste_cache = PasteCache(
+            history_manager, config.get("paste_cache_bytes", 128 * 1024 * 1024), WIN32_AVAILABLE
+        )
 
-        self.full_history = []
-        self.filtered_items = []
         self.previous_window = None
         self.current_window = None
-        self.displayed_version = 0
-        self.mouse_listener = None  # 新增：鼠标监听器实例
+        self.mouse_listener = None  # 鼠标监听器实例，开启 mouse_tracking 时才创建
+        self.com_initialized = False
+        self.startup_finished = False  # 只在第一次绘制后执行一次（热键注册）
+        self.session_active = False  # COM 和鼠标监听：关闭窗口时停止，再次显示时重新开始
 
         # === 窗口设置 ===
         self.setWindowTitle(config.get("window_title", "剪贴板历史"))
@@ -84,14 +89,29 @@ class ClipboardGUI(QMainWindow):
         search_layout.addWidget(clear_btn)
         left_layout.addLayout(search_layout)
 
-        # 列表
-        self.list_widget = QListWidget()
-        self.list_widget.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        self.list_widget.itemDoubleClicked.connect(self.select_and_copy)
-        self.list_widget.currentItemChanged.connect(self.update_preview)
-        self.list_widget.setIconSize(QSize(256, 256))
-        self.list_widget.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
-        left_layout.addWidget(self.list_widget)
+        # 列表（模型按需加载，滚动到底部时自动 fetchMore）
+        # 模糊搜索在后台线程进行，输入时不阻塞界面；客户端模式下由调用方传入远程搜索
+        self.searcher = config.get("searcher") or FuzzySearcher(
+            history_manager, self.page_size, config.get("search_max_chars", 4096),
+            config.get("search_recency_weight", 16), config.get("search_frequency_weight", 8)
+        )
+        self.searcher.start()
+        self.list_model = HistoryListModel(
+            history_manager, self.pixmap_cache, self.page_size, self.thumb_size, self,
+            searcher=self.searcher
+        )
+        self.list_model.search_updated.connect(self.on_search_updated)
+        self.list_view = QListView()
+        self.list_view.setModel(self.list_model)
+        self.list_view.setItemDelegate(HistoryItemDelegate(self.thumb_size, self.list_view))
+        self.list_view.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.list_view.doubleClicked.connect(self.select_and_copy)
+        self.list_view.selectionModel().currentChanged.connect(self.update_preview)
+        self.list_view.setIconSize(QSize(256, 256))
+        self.list_view.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
+        self.list_view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.list_view.customContextMenuRequested.connect(self.show_context_menu)
+        left_layout.addWidget(self.list_view)
 
         # 底部栏
         bottom_layout = QHBoxLayout()
@@ -116,227 +136,321 @@ class ClipboardGUI(QMainWindow):
         self.preview_stack.addWidget(self.preview_text)
         self.preview_stack.addWidget(self.preview_image)
 
+        # 预览大图在后台线程解码和缩放，不阻塞界面
+        self.preview_blob = None  # 当前应显示的预览图
+        self.preview_loader = PreviewLoader(history_manager, (400, 400), self)
+        self.preview_loader.loaded.connect(self.on_preview_loaded, Qt.ConnectionType.QueuedConnection)
+
         # ---------- 将左右部件添加到分隔条 ----------
         self.splitter.addWidget(left_widget)
         self.splitter.addWidget(self.preview_stack)
 
         self.splitter.setSizes([300, 400])
 
-        # === 热键注册 ===
-        keyboard.add_hotkey(self.config["hotkey"], self.on_hotkey)
-
-        # === 定时器轮询队列 ===
-        self.queue_timer = QTimer()
-        self.queue_timer.timeout.connect(self.poll_queue)
-        self.queue_timer.start(self.config.get("queue_poll_ms", 200))
+        # === 变化通知 ===
+        # 事件可能来自采集线程，一律排队到主线程按顺序处理
+        self.history_event.connect(self.on_history_event, Qt.ConnectionType.QueuedConnection)
+        self.show_requested.connect(self.open_history_window, Qt.ConnectionType.QueuedConnection)
+        self.exit_requested.connect(QApplication.quit, Qt.ConnectionType.QueuedConnection)
+        history_manager.subscribe(self.history_event.emit)
 
-        # 初始加载
+        # 初始加载（先订阅再读取，之间发生的变化由事件的 version 去重）
         self.refresh_listbox()
         
         # 连接粘贴信号到槽函数
+        self.paste_controller = PasteController(
+            self.set_clipboard_entry, activate_window,
+            self.config.get("get_active_window") or (lambda: None),
+            lambda: int(self.winId()), parent=self
+        )
         self.paste_signal.connect(self.handle_paste_in_main_thread)
 
+        # 各组件已有的统计，汇总到 --metrics 的快照里
+        METRICS.add_source("pixmap_cache", self.pixmap_cache.stats)
+        METRICS.add_source("paste_cache", self.paste_cache.stats)
+        METRICS.add_source("paste_steps_avg_ms", self.paste_controller.stats)
+
     # ---------------- 功能逻辑 ----------------
 
-   
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.startup_finished:
+            # COM、热键和鼠标监听等到窗口第一次绘制后再初始化
+            self.startup_finished = True
+            self.session_active = True
+            QTimer.singleShot(0, self.finish_startup)
+        elif not self.session_active:
+            # 关闭后再次显示：只重新开始 COM 和鼠标监听
+            self.session_active = True
+            QTimer.singleShot(0, self.start_session)
+
+    def finish_startup(self):
+        """窗口第一次绘制后执行的初始化，不占用首屏前的时间"""
+        # === 热键注册 ===（客户端模式下热键由采集进程负责），只注册一次
+        if self.config.get("hotkey"):
+            import keyboard
+            keyboard.add_hotkey(self.config["hotkey"], self.on_hotkey)
+
+        self.start_session()
+
+    def start_session(self):
+        """窗口显示期间需要的 COM 环境和鼠标监听，closeEvent 中停止"""
+        import pythoncom
+
+        # 主线程中初始化COM环境
+        try:
+            pythoncom.CoInitializeEx(pythoncom.COINIT_APARTMENTTHREADED)
+        except:
+            pythoncom.CoInitialize()
+        self.com_initialized = True
+
+        if self.config.get("mouse_tracking"):
+            self.start_mouse_listener()
+
+    def start_mouse_listener(self):
+        """鼠标点击时记录前台窗口，热键呼出时据此确定粘贴目标"""
+        from pynput.mouse import Listener
+
+        get_active_window = self.config.get("get_active_window")
+        if get_active_window is None:
+            return
+
+        def on_click(x, y, button, pressed):
+            if pressed:
+                hwnd = get_active_window()
+                if hwnd and hwnd != int(self.winId()):
+                    self.current_window = hwnd
+
+        self.mouse_listener = Listener(on_click=on_click)
+        self.mouse_listener.start()
+
     def closeEvent(self, event):
         # 关闭窗口时停止鼠标监听
         if self.mouse_listener and self.mouse_listener.is_alive():
             self.mouse_listener.stop()
         # 清理COM环境
-        try:
-            pythoncom.CoUninitialize()
-        except:
-            pass
+        if self.com_initialized:
+            import pythoncom
+            try:
+                pythoncom.CoUninitialize()
+            except:
+                pass
+            self.com_initialized = False
+        self.session_active = False
         event.ignore()
         self.hide()
+        if self.config.get("exit_on_hide"):
+            # 客户端模式：界面只在需要时运行，隐藏即退出，下次热键再由采集进程启动
+            QApplication.quit()
 
     # 以下方法保持不变...
     def update_preview(self, current, previous):
-        if not current:
-            self.preview_text.clear()
-            self.preview_stack.setCurrentWidget(self.preview_text)
+        with METRICS.timer("gui.update_preview"):
+            if not current.isValid():
+                self.preview_text.clear()
+                self.preview_stack.setCurrentWidget(self.preview_text)
+                return
+
+            entry = current.data(Qt.ItemDataRole.UserRole)
+            if isinstance(entry, dict) and entry.get("type") == "image":
+                # 选中的条目最可能被粘贴，优先预热
+                self.paste_cache.prewarm(entry, urgent=True)
+                self.preview_blob = entry.get("blob")
+                pixmap = self.pixmap_cache.get(("preview", self.preview_blob))
+                if pixmap is None:
+                    # 解码和缩放交给后台线程，完成后由 on_preview_loaded 显示
+                    self.preview_image.clear()
+                    self.preview_loader.request(entry)
+                else:
+                    self.preview_image.setPixmap(pixmap)
+                self.preview_stack.setCurrentWidget(self.preview_image)
+            else:
+                self.preview_blob = None
+                entry = self.history_manager.get_full(entry)
+                text = entry["data"] if isinstance(entry, dict) else str(entry)
+                self.preview_text.setPlainText(text)
+                self.preview_stack.setCurrentWidget(self.preview_text)
+
+    def on_preview_loaded(self, blob, image):
+        if image.isNull():
             return
-
-        entry = current.data(Qt.ItemDataRole.UserRole)
-        if isinstance(entry, dict) and entry.get("type") == "image":
-            pixmap = QPixmap()
-            pixmap.loadFromData(base64.b64decode(entry["data"]))
-            self.preview_image.setPixmap(pixmap.scaled(400, 400, Qt.AspectRatioMode.KeepAspectRatio,
-                                                       Qt.TransformationMode.SmoothTransformation))
-            self.preview_stack.setCurrentWidget(self.preview_image)
-        else:
-            text = entry["data"] if isinstance(entry, dict) else str(entry)
-            self.preview_text.setPlainText(text)
-            self.preview_stack.setCurrentWidget(self.preview_text)
+        pixmap = QPixmap.fromImage(image)
+        self.pixmap_cache.put(("preview", blob), pixmap)
+        if blob == self.preview_blob:
+            self.preview_image.setPixmap(pixmap)
 
     def on_hotkey(self):
         # 热键按下时也更新一次窗口信息
         if self.current_window and self.current_window != self.previous_window:
             self.previous_window = self.current_window
-        try:
-            self.cmd_queue.put_nowait("show")
-        except Exception:
-            pass
+        self.show_requested.emit()
+
+    def request_show(self, target_window=None):
+        """从任意线程请求显示窗口，target_window 为之后粘贴的目标窗口"""
+        if target_window:
+            self.previous_window = target_window
+        self.show_requested.emit()
 
     def open_history_window(self):
         self.show()
         self.raise_()
         self.activateWindow()
-        self.refresh_listbox()
+        self.select_first()
 
     def refresh_listbox(self):
-        self.full_history = self.history_manager.get_copy()
-        self.filter_list(self.search_entry.text())
-        self.status_label.setText(f"历史记录: {len(self.full_history)} 条")
-        self.displayed_version = self.history_manager.version
-
-        if self.list_widget.count() > 0:
-            self.list_widget.setCurrentRow(0)
-            self.list_widget.setFocus()
+        """重新读取列表第一页"""
+        self.list_model.reload()
+        self.update_status()
+        self.prewarm_recent()
+        self.select_first()
+
+    def on_history_event(self, event):
+        """历史记录变化：只改动受影响的行"""
+        self.list_model.apply_event(event)
+        self.update_status()
+        self.prewarm_recent()
+        if isinstance(event, (Cleared, Reset)) \
+                or (isinstance(event, Inserted) and event.index == 0) \
+                or (isinstance(event, Moved) and event.dest == 0):
+            self.select_first()
+
+    def prewarm_recent(self):
+        """在后台准备最新几张图片的粘贴数据"""
+        limit = self.config.get("paste_prewarm_recent", 2)
+        if self.list_model.query or limit <= 0:
+            return
+        for entry in self.list_model.entries[:self.page_size]:
+            if limit <= 0:
+                break
+            if isinstance(entry, dict) and entry.get("type") == "image":
+                self.paste_cache.prewarm(entry)
+                limit -= 1
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # 隐藏期间不选中新条目（避免加载预览），显示时再选中第一条
+        self.select_first()
+
+    def select_first(self):
+        if not self.isVisible():
+            return
+        if self.list_model.rowCount() > 0:
+            self.list_view.setCurrentIndex(self.list_model.index(0))
+            self.list_view.setFocus()
 
     def filter_list(self, text):
-        text = text.strip().lower()
-        self.list_widget.clear()
-        self.filtered_items = []
-
-        for entry in self.full_history:
-            match_text = ""
-            if isinstance(entry, dict):
-                if entry.get("type") == "text":
-                    match_text = entry["data"]
-                elif entry.get("type") == "image":
-                    match_text = "[图片]"
-            else:
-                match_text = str(entry)
-
-            if text in match_text.lower():
-                lw_item = QListWidgetItem()
-                if isinstance(entry, dict) and entry.get("type") == "image":
-                    pixmap = QPixmap()
-                    pixmap.loadFromData(base64.b64decode(entry["data"]))
-                    
-                    # 设置更大的图片尺寸，并确保不超过列表宽度
-                    available_width = self.list_widget.width() - 40  # 减去边距和滚动条空间
-                    target_size = min(available_width, 150)  # 最大150px，或适应列表宽度
-                    
-                    scaled_pixmap = pixmap.scaled(
-                        128,100,
-                        Qt.AspectRatioMode.KeepAspectRatio,
-                        Qt.TransformationMode.SmoothTransformation
-                    )
-                    
-                    lw_item.setIcon(QIcon(scaled_pixmap))
-                    lw_item.setText("[图片]")
-                    
-                    # 设置列表项尺寸以适应图片
-                    item_height = max(scaled_pixmap.height() + 32, 80)  # 至少80px高
-                    lw_item.setSizeHint(QSize(available_width, item_height))
-                    
-                else:
-                    lw_item.setText(self.format_item_text(match_text))
-                    # 文本项使用默认高度
-                    lw_item.setSizeHint(QSize(-1, 60))
-                    
-                lw_item.setData(Qt.ItemDataRole.UserRole, entry)
-                self.list_widget.addItem(lw_item)
-                self.filtered_items.append(entry)
-
-        if not text:
-            self.status_label.setText(f"历史记录: {len(self.full_history)} 条")
+        with METRICS.timer("gui.filter_list"):
+            # 有查询时只提交给后台搜索线程，结果由 on_search_updated 显示
+            self.list_model.set_query(text)
+            self.update_status()
+
+            if self.list_model.rowCount() > 0:
+                self.list_view.setCurrentIndex(self.list_model.index(0))
+
+    def on_search_updated(self, done):
+        self.update_status()
+        if self.list_model.rowCount() > 0:
+            self.list_view.setCurrentIndex(self.list_model.index(0))
+
+    def update_status(self):
+        stats = self.pixmap_cache.stats()
+        self.status_label.setToolTip(
+            f"图片缓存: {stats['entries']} 张, {stats['bytes'] // 1024} KB, "
+            f"命中率 {stats['hit_rate']:.0%}"
+        )
+        if not self.list_model.query:
+            self.status_label.setText(f"历史记录: {self.history_manager.get_total()} 条")
+        elif self.list_model.searching:
+            self.status_label.setText(f"搜索中... 已找到 {self.list_model.rowCount()} 条")
         else:
             self.status_label.setText(
-                f"找到 {len(self.filtered_items)}/{len(self.full_history)} 条匹配记录"
+                f"找到 {self.list_model.rowCount()}/{self.history_manager.get_total()} 条匹配记录"
             )
 
-        if self.list_widget.count() > 0:
-            self.list_widget.setCurrentRow(0)
-
-            
-    def select_and_copy(self, item):
-        entry = item.data(Qt.ItemDataRole.UserRole)
+    def select_and_copy(self, index):
+        entry = index.data(Qt.ItemDataRole.UserRole)
         self.paste_immediately(entry)
 
+    def show_context_menu(self, pos):
+        index = self.list_view.indexAt(pos)
+        if not index.isValid():
+            return
+        entry = index.data(Qt.ItemDataRole.UserRole)
+        pinned = bool(entry.get("pinned"))
+        menu = QMenu(self)
+        action = menu.addAction("取消固定" if pinned else "固定（不会被自动清理）")
+        if menu.exec(self.list_view.viewport().mapToGlobal(pos)) is action:
+            self.history_manager.set_pinned(entry, not pinned)
+            self.history_manager.request_save()
+            self.list_model.dataChanged.emit(index, index)
+
     def paste_immediately(self, entry):
         """发射信号，在主线程中处理剪贴板操作"""
         self.paste_signal.emit(entry)
 
     def handle_paste_in_main_thread(self, entry):
-        """在主线程中处理剪贴板设置和粘贴"""
-        def do_paste():
-            try:
-                print(f"处理粘贴: {entry}")
-                
-                if isinstance(entry, dict) and entry.get("type") == "image":
-                    # 尝试使用Windows API设置图片到剪贴板
-                    if WIN32_AVAILABLE:
-                        success = self.set_image_to_clipboard_win32(entry["data"])
-                        if not success:
-                            # 如果Windows API失败，尝试Qt方式
-                            success = self.set_image_to_clipboard_qt(entry["data"])
-                    else:
-                        # 使用Qt方式
-                        success = self.set_image_to_clipboard_qt(entry["data"])
-                    
-                    if not success:
-                        print("设置图片到剪贴板失败")
-                        return
-                else:
-                    # 处理文本粘贴
-                    text = entry["data"] if isinstance(entry, dict) else str(entry)
-                    clipboard = QApplication.clipboard()
-                    clipboard.clear()
-                    QApplication.processEvents()
-                    time.sleep(0.05)
-                    
-                    clipboard.setText(text)
-                    QApplication.processEvents()
-                    print(f"文本已设置到剪贴板: {text[:50]}...")
-
-                # 短暂延迟确保剪贴板设置完成
-                time.sleep(0.15)
-
-                # 窗口激活处理
-                if self.previous_window:
-                    success = activate_window(self.previous_window)
-                    if success:
-                        time.sleep(0.15)
-                    else:
-                        keyboard.press_and_release("alt+tab")
-                        time.sleep(0.1)
-                else:
-                    keyboard.press_and_release("alt+tab")
-                    time.sleep(0.1)
-
-                # 执行粘贴操作
-                keyboard.press_and_release("ctrl+v")
-                print("粘贴操作完成")
+        """在主线程中启动粘贴状态机，不阻塞界面"""
+        self.paste_controller.start(entry, self.previous_window)
 
+    def set_clipboard_entry(self, entry):
+        """把条目放到剪贴板，返回判断剪贴板已就绪的函数，失败返回 None"""
+        if isinstance(entry, dict) and entry.get("type") == "image":
+            return self.set_image_entry_to_clipboard(entry)
+        full_entry = self.history_manager.get_full(entry)
+        if isinstance(entry, dict) and entry.get("type") == "files":
+            # 文件很多时条目可能是占位或压缩的，先取完整路径列表
+            return self.set_files_to_clipboard(full_entry["data"].splitlines())
+
+        text = full_entry["data"] if isinstance(full_entry, dict) else str(full_entry)
+        clipboard = QApplication.clipboard()
+        clipboard.setText(text)
+        return lambda: clipboard.ownsClipboard() or clipboard.text() == text
+
+    def set_files_to_clipboard(self, paths):
+        """复制的文件：以文件列表（Windows 上为 CF_HDROP）放回剪贴板，粘贴到资源管理器即复制文件"""
+        mime = QMimeData()
+        mime.setUrls([QUrl.fromLocalFile(p) for p in paths])
+        mime.setText("\n".join(paths))
+        clipboard = QApplication.clipboard()
+        clipboard.setMimeData(mime)
+        return lambda: clipboard.ownsClipboard() or clipboard.mimeData().hasUrls()
+
+    def set_image_entry_to_clipboard(self, entry):
+        """图片条目：优先用预热好的数据，否则延迟渲染，都不需要在粘贴时解码和重新编码"""
+        delayed = self.config.get("paste_delayed_rendering", True)
+        data = self.paste_cache.get(entry)
+        if data is None and not delayed:
+            try:
+                data = self.paste_cache.render(entry)
             except Exception as e:
-                print(f"[ERROR] 粘贴失败: {str(e)}")
-                import traceback
-                print(f"[ERROR] 异常堆栈: {traceback.format_exc()}")
-
-        # 延迟执行粘贴操作，确保UI操作完成
-        QTimer.singleShot(100, do_paste)
+                print(f"[ERROR] 转换图片失败: {e}")
+        if data is not None:
+            if self.paste_cache.kind == "image":
+                return self.set_image_to_clipboard_qt(data)
+            # 尝试使用Windows API设置图片到剪贴板，失败时改用Qt方式
+            if self.set_image_to_clipboard_win32(data):
+                return lambda: True  # SetClipboardData 返回时数据已就绪
+        if delayed:
+            return self.set_image_to_clipboard_delayed(entry)
+        return self.set_image_to_clipboard_qt(self.load_paste_image(entry))
+
+    def load_paste_image(self, entry):
+        image_data = self.history_manager.read_image(entry)
+        if image_data is None:
+            print("图片文件不存在")
+            return QImage()
+        return QImage.fromData(image_data)
+
+    def set_image_to_clipboard_win32(self, dib):
+        """使用Windows API设置图片到剪贴板（dib 为 CF_DIB 数据）"""
+        import win32clipboard
+        import win32con
 
-    def set_image_to_clipboard_win32(self, base64_data):
-        """使用Windows API设置图片到剪贴板"""
         try:
-            image_data = base64.b64decode(base64_data)
-            image = Image.open(io.BytesIO(image_data))
-            
-            # 转换为BMP格式
-            output = io.BytesIO()
-            image.save(output, format='BMP')
-            data = output.getvalue()[14:]  # 移除BMP文件头
-            
             win32clipboard.OpenClipboard()
             win32clipboard.EmptyClipboard()
-            win32clipboard.SetClipboardData(win32con.CF_DIB, data)
+            win32clipboard.SetClipboardData(win32con.CF_DIB, dib)
             win32clipboard.CloseClipboard()
-            
-            print("使用Windows API设置图片到剪贴板成功")
             return True
             
         except Exception as e:
@@ -347,37 +461,20 @@ class ClipboardGUI(QMainWindow):
                 pass
             return False
 
-    def set_image_to_clipboard_qt(self, base64_data):
-        """使用Qt API设置图片到剪贴板"""
-        try:
-            clipboard = QApplication.clipboard()
-            pixmap = QPixmap()
-            image_data = base64.b64decode(base64_data)
-            load_success = pixmap.loadFromData(image_data)
-            
-            if load_success:
-                clipboard.clear()
-                QApplication.processEvents()
-                time.sleep(0.05)
-                
-                clipboard.setPixmap(pixmap)
-                QApplication.processEvents()
-                
-                # 验证剪贴板内容
-                test_pixmap = clipboard.pixmap()
-                if not test_pixmap.isNull():
-                    print(f"使用Qt设置图片到剪贴板成功，尺寸: {test_pixmap.size()}")
-                    return True
-                else:
-                    print("Qt设置图片后剪贴板为空")
-                    return False
-            else:
-                print("Qt加载图片失败")
-                return False
-                
-        except Exception as e:
-            print(f"Qt设置图片失败: {e}")
-            return False
+    def set_image_to_clipboard_qt(self, image):
+        """使用Qt API设置图片到剪贴板，返回判断已就绪的函数，失败返回 None"""
+        if image.isNull():
+            print("Qt加载图片失败")
+            return None
+        clipboard = QApplication.clipboard()
+        clipboard.setImage(image)
+        return lambda: clipboard.ownsClipboard() or not clipboard.image().isNull()
+
+    def set_image_to_clipboard_delayed(self, entry):
+        """延迟渲染：剪贴板里先只声明有图片，目标程序读取时才加载"""
+        clipboard = QApplication.clipboard()
+        clipboard.setMimeData(DelayedImageMimeData(lambda: self.load_paste_image(entry)))
+        return lambda: clipboard.ownsClipboard() or clipboard.mimeData().hasImage()
 
     def clear_history_confirm(self):
         reply = QMessageBox.question(
@@ -386,54 +483,10 @@ class ClipboardGUI(QMainWindow):
         )
         if reply == QMessageBox.StandardButton.Yes:
             self.history_manager.clear()
-            self.history_manager.save()
-            self.refresh_listbox()
-
-    def poll_queue(self):
-        try:
-            cmd = self.cmd_queue.get_nowait()
-        except Exception:
-            cmd = None
-
-        if cmd == "show":
-            self.open_history_window()
-
-        if self.displayed_version != self.history_manager.version:
-            self.refresh_listbox()
+            self.history_manager.request_save()
 
     def format_item_text(self, text):
-        if not text:
-            return ""
-        text = text.strip()
-        if len(text) <= 20:
-            return text
-
-        lines, current_line = [], ""
-        words = text.split()
-
-        for word in words:
-            if len(current_line) + len(word) + (1 if current_line else 0) <= 20:
-                current_line += (" " if current_line else "") + word
-            else:
-                if current_line:
-                    lines.append(current_line)
-                current_line = word
-                if len(lines) >= 3:
-                    if len(current_line) > 17:
-                        current_line = current_line[:17] + "..."
-                    else:
-                        current_line += "..."
-                    lines.append(current_line)
-                    break
-
-        if current_line and len(lines) < 3:
-            lines.append(current_line)
-        elif current_line and len(lines) >= 3:
-            last_line = lines[-1]
-            lines[-1] = (last_line[:17] + "...") if len(last_line) > 17 else last_line + "..."
-
-        return "\n".join(lines)
-
+        return format_item_text(text)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
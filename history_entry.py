@@ -0,0 +1,92 @@
+def entry_search_text(entry):
+    """条目用于搜索和列表显示的文本"""
+    if isinstance(entry, dict):
+        if entry.get("type") == "image":
+            return "[图片]"
+        return entry.get("data", "")
+    return str(entry)
+
+
+def entry_search_key(entry):
+    """小写搜索键；文本本来就是小写时直接返回原字符串，不再复制一份"""
+    text = entry_search_text(entry)
+    key = text.lower()
+    return text if key == text else key
+
+
+def format_item_text(text):
+    """列表中显示的文本：最多 3 行，每行约 20 个字符"""
+    if not text:
+        return ""
+    text = text.strip()
+    if len(text) <= 20:
+        return text
+
+    lines, current_line = [], ""
+    words = text.split()
+
+    for word in words:
+        if len(current_line) + len(word) + (1 if current_line else 0) <= 20:
+            current_line += (" " if current_line else "") + word
+        else:
+            if current_line:
+                lines.append(current_line)
+            current_line = word
+            if len(lines) >= 3:
+                if len(current_line) > 17:
+                    current_line = current_line[:17] + "..."
+                else:
+                    current_line += "..."
+                lines.append(current_line)
+                break
+
+    if current_line and len(lines) < 3:
+        lines.append(current_line)
+    elif current_line and len(lines) >= 3:
+        last_line = lines[-1]
+        lines[-1] = (last_line[:17] + "...") if len(last_line) > 17 else last_line + "..."
+
+    return "\n".join(lines)
+
+
+def entry_preview(entry):
+    """列表中显示的文本（图片为固定标记，文件列表带图标）"""
+    if isinstance(entry, dict) and entry.get("type") == "image":
+        return "[图片]"
+    text = format_item_text(entry_search_text(entry))
+    if isinstance(entry, dict) and entry.get("type") == "files":
+        text = "📁 " + text
+    return text
+
+
+class HistoryEntry(dict):
+    """内存中的历史条目
+
+    仍然是 dict（字段、JSON 格式和 .get()/[] 用法与原来相同），另外用 __slots__ 缓存
+    列表显示文本（preview），第一次显示时才计算，没显示过的条目不占内存。
+    搜索键由搜索索引自己保存，这里不再存一份。
+    改动 "data" 等内容字段后需要调用 refresh()。
+    """
+
+    __slots__ = ("_preview",)
+
+    def refresh(self):
+        try:
+            del self._preview
+        except AttributeError:
+            pass
+
+    @property
+    def preview(self):
+        try:
+            return self._preview
+        except AttributeError:
+            self._preview = entry_preview(self)
+            return self._preview
+
+    @classmethod
+    def wrap(cls, entry):
+        """把普通 dict 条目转换为 HistoryEntry，已经是的原样返回"""
+        if isinstance(entry, cls) or not isinstance(entry, dict):
+            return entry
+        return cls(entry)
@@ -0,0 +1,11 @@
+from collections import namedtuple
+
+# HistoryManager 发布的变化事件，index 都是变化发生时在历史列表（最新在前）中的位置。
+# version 为变化后的 HistoryManager.version，同一次操作产生的多个事件 version 相同。
+
+Inserted = namedtuple("Inserted", "version index entries")   # 在 index 处插入 entries
+Removed = namedtuple("Removed", "version index count")       # 删除 index 开始的 count 项
+Moved = namedtuple("Moved", "version source dest entry")     # 把 source 处的 entry 移到 dest
+Changed = namedtuple("Changed", "version index entry")       # index 处条目的属性变化（如固定）
+Cleared = namedtuple("Cleared", "version")                   # 清空
+Reset = namedtuple("Reset", "version")                       # 整体变化（如重新加载），订阅方应重新读取
@@ -1,83 +1,753 @@
+import base64
+import hashlib
 import json
+import lzma
 import os
 import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from blob_store import BlobStore, IMAGE_SUFFIXES, png_size
+from eviction import EvictionPolicy, entry_bytes, entry_kind
+from history_entry import HistoryEntry, entry_search_key
+from history_events import Inserted, Removed, Moved, Changed, Cleared, Reset
+from image_hash import HashIndex
+from metrics import METRICS
+from search_index import SearchIndex
+
+
+def entry_digest(entry):
+    """条目内容摘要：图片直接用 blob 哈希，文本对内容做哈希（文件列表与同样内容的文本区分开）"""
+    if entry.get("type") == "image":
+        return entry["blob"]
+    data = entry.get("data", "")
+    if entry.get("type") == "files":
+        data = "files\n" + data
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def entry_matcher(query=None, predicate=None):
+    """批量操作的条件：query 为不区分大小写的子串，predicate(条目) 为任意判断，同时给出时都要满足
+
+    占位条目（尚未读取完整内容）只匹配预览文本。
+    """
+    query = query.lower() if query else None
+
+    def match(entry):
+        if query and query not in entry_search_key(entry):
+            return False
+        return predicate is None or bool(predicate(entry))
+    return match
+
+
+# 文本压缩算法：名称 -> (压缩, 解压)
+TEXT_CODECS = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+
+def compress_text_entry(entry, threshold, prefix_chars, codec="zlib"):
+    """超过 threshold 个字符的文本条目压缩保存
+
+    "data" 只保留前 prefix_chars 个字符的明文，用于列表显示和搜索；
+    完整内容压缩后以 base64 存在 "payload" 中，"length" 为原文长度。
+    压缩效果不明显时原样返回。
+    """
+    if entry.get("type") != "text" or "codec" in entry or entry.get("lazy"):
+        return entry
+    text = entry.get("data", "")
+    if not threshold or len(text) <= threshold:
+        return entry
+    raw = text.encode("utf-8")
+    packed = TEXT_CODECS[codec][0](raw)
+    if len(packed) > len(raw) * 0.9:
+        return entry
+    return dict(entry, data=text[:prefix_chars], codec=codec, length=len(text),
+                payload=base64.b64encode(packed).decode("ascii"))
+
+
+def decompress_text_entry(entry):
+    """还原压缩的文本条目，未压缩的原样返回"""
+    codec = entry.get("codec")
+    if codec is None:
+        return entry
+    text = TEXT_CODECS[codec][1](base64.b64decode(entry["payload"])).decode("utf-8")
+    full = {k: v for k, v in entry.items() if k not in ("codec", "length", "payload")}
+    full["data"] = text
+    return full
+
 
 class HistoryManager:
-    def __init__(self, max_items, history_file):
+    def __init__(self, max_items, storage, legacy_file=None, blob_dir="clipboard_blobs",
+                 index_max_chars=4096, compress_threshold=64 * 1024, compress_prefix_chars=4096,
+                 compress_codec="zlib", policy=None, near_duplicate_distance=None):
+        """max_items: 内存中保留的最近条数；更早的条目由 storage 后端按需分页读取
+
+        compress_threshold: 超过这个字符数的文本在内存和磁盘上都压缩保存，0 表示不压缩
+        policy: 内存窗口的淘汰策略（EvictionPolicy），默认只限制条数为 max_items
+        near_duplicate_distance: 新图片与窗口内同尺寸图片的感知哈希相差不超过这么多位时，
+            视为近似重复并替换旧条目；None 表示只去除完全相同的图片
+        """
         self.max_items = max_items
-        self.history_file = history_file
+        self.policy = policy or EvictionPolicy(max_items)
+        self.storage = storage
+        self.legacy_file = legacy_file
+        self.compress_threshold = compress_threshold
+        self.compress_prefix_chars = compress_prefix_chars
+        self.compress_codec = compress_codec
         self.history = []
+        self.history_ids = []  # 与 history 一一对应的索引 id
+        self.next_id = 0
+        self.digest_index = {}  # 内容摘要 -> 条目 id，用于全历史去重
+        self.entries_by_id = {}  # 条目 id -> 窗口中的条目对象
+        self.bytes_used = {"text": 0, "image": 0}  # 窗口内各类型条目的字节数，随增删更新
+        # 各类型未固定条目的 id -> 条目，从旧到新；淘汰时直接取最旧的，不必逐个跳过固定条目
+        self.evictable = {"text": OrderedDict(), "image": OrderedDict()}
+        self.search_index = SearchIndex(index_max_chars)
+        self.near_duplicate_distance = near_duplicate_distance
+        self.phash_index = HashIndex()  # 图片感知哈希 -> 条目 id
         self.history_lock = threading.Lock()
-        self.version = 0  # 用于检测更新
+        self.save_lock = threading.Lock()  # 保证记录按产生顺序写入后端
+        self.blob_store = BlobStore(blob_dir)
+        self.pending_records = []  # 尚未写入后端的记录
+        self.writer = None  # 后台持久化线程，见 persistence.PersistenceThread
+        self.version = 0  # 每次变化加一，随变化事件一起发布
+        self.subscribers = []  # 变化事件的订阅者，见 subscribe()
+        self.subscribers_lock = threading.Lock()
+        self.loading = False  # 后台仍在读取大条目的完整内容
+        self.startup_metrics = {}
+        self.created_at = time.perf_counter()
         self.load()
 
     def load(self):
-        """加载历史记录从文件"""
+        """加载历史记录：从存储后端读取最新一页，或从旧版 JSON 文件迁移
+
+        存储后端可能先返回只含元数据和预览的占位条目，列表可以立即显示，
+        完整内容在后台线程中补齐。
+        """
         try:
-            if not os.path.exists(self.history_file):
-                self.save()
-                return
-            
-            if os.path.getsize(self.history_file) == 0:
-                with open(self.history_file, 'w', encoding='utf-8') as f:
-                    json.dump([], f)
-                self.clear()
+            if self.storage.exists():
+                history = self.storage.load(self.max_items)
+                migrated = self.migrate_inline_images(history)
+                self.add_digests(history)
+                history = [self.compress_entry(e) for e in history]
+                if migrated:
+                    history = [self.compress_entry(self.storage.load_payload(e)) for e in history]
+                    self.blob_store.flush()
+                    self.storage.rewrite(history)
+            elif self.legacy_file and os.path.exists(self.legacy_file) \
+                    and os.path.getsize(self.legacy_file) > 0:
+                history = self.load_legacy()
+                self.migrate_inline_images(history)
+                self.add_digests(history)
+                history = [self.compress_entry(e) for e in history]
+                self.blob_store.flush()
+                self.storage.rewrite(history)
+                history = history[:self.max_items]
+            else:
+                self.storage.rewrite([])
                 return
 
-            with open(self.history_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if isinstance(data, list):
-                    with self.history_lock:
-                        self.history = data[:self.max_items]
-                    self.version += 1
-                else:
-                    raise ValueError("历史文件格式错误")
+            # 转换为 HistoryEntry，显示文本之后在条目上按需缓存
+            history = [HistoryEntry.wrap(e) for e in history]
+            with self.history_lock:
+                self.history = history
+                self.history_ids = []
+                self.search_index.clear()
+                self.digest_index.clear()
+                self.entries_by_id.clear()
+                self.phash_index.clear()
+                self.bytes_used = {"text": 0, "image": 0}
+                for entry in history:
+                    self.history_ids.append(self.index_entry(entry))
+                self.rebuild_evictable()
+                # 预算或保留时间可能在两次启动之间被调小
+                self.pending_records = self.enforce_policy()
+                self.version += 1
+                self.publish([Reset(self.version)])
+
+            self.startup_metrics["time_to_first_row_ms"] = self.elapsed_ms()
+            METRICS.observe("history.load", self.startup_metrics["time_to_first_row_ms"])
+            lazy = [e for e in history if e.get("lazy")]
+            if lazy:
+                self.loading = True
+                threading.Thread(target=self.load_payloads, args=(lazy,), daemon=True).start()
+            else:
+                self.startup_metrics["full_load_ms"] = self.elapsed_ms()
         except Exception as e:
             print(f"[ERROR] 加载历史失败: {e}")
             self.clear()
             self.save()
 
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.created_at) * 1000
+
+    def load_payloads(self, stubs):
+        """后台补齐占位条目的完整内容（原地更新，条目对象不变）
+
+        读不到内容的占位条目从窗口中删除：留下的话之后的压缩会把预览当作正文写回。
+        """
+        failed = []
+        for stub in stubs:
+            try:
+                full = self.compress_entry(self.storage.load_payload(stub))
+            except Exception as e:
+                print(f"[ERROR] 读取历史内容失败: {e}")
+                failed.append(stub)
+                continue
+            with self.history_lock:
+                entry_id = self.digest_index.get(stub.get("digest"))
+                if entry_id is None or self.entries_by_id.get(entry_id) is not stub:
+                    # 读取期间已被删除、淘汰或清空，字节数已在移出时减掉
+                    continue
+                kind = entry_kind(stub)
+                self.bytes_used[kind] -= entry_bytes(stub)
+                stub.update(full)
+                stub.pop("lazy", None)
+                stub.refresh()
+                self.bytes_used[kind] += entry_bytes(stub)
+                # 索引里原来只有预览文本，换成完整内容
+                self.search_index.remove(entry_id)
+                self.search_index.add(entry_id, entry_search_key(stub))
+        with self.history_lock:
+            records = []
+            for stub in failed:
+                index = next((i for i, e in enumerate(self.history) if e is stub), None)
+                if index is None:
+                    continue
+                self.unindex_entry(self.history_ids[index], stub)
+                del self.history[index]
+                del self.history_ids[index]
+                records.append({"op": "remove", "index": index, "digest": stub.get("digest")})
+            # 占位条目按预览计算字节数，补齐后重新检查预算
+            records.extend(self.enforce_policy())
+            if records:
+                self.pending_records.extend(records)
+                self.version += 1
+                self.publish(self.removal_events(records))
+        self.loading = False
+        self.startup_metrics["full_load_ms"] = self.elapsed_ms()
+        METRICS.observe("history.load_payloads", self.startup_metrics["full_load_ms"])
+
+    def get_full(self, entry):
+        """返回条目的完整内容（用于预览和粘贴）
+
+        占位条目会同步读取一次，压缩的文本在这里解压。
+        """
+        if not isinstance(entry, dict):
+            return entry
+        if entry.get("lazy"):
+            entry = self.storage.load_payload(entry)
+        return decompress_text_entry(entry)
+
+    def compress_entry(self, entry):
+        return compress_text_entry(entry, self.compress_threshold, self.compress_prefix_chars,
+                                   self.compress_codec)
+
+    def load_legacy(self):
+        """读取旧版整文件 JSON 格式的历史记录"""
+        with open(self.legacy_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, list):
+            raise ValueError("历史文件格式错误")
+        # 更早的版本直接保存字符串
+        return [{"type": "text", "data": e} if isinstance(e, str) else e for e in data]
+
+    @staticmethod
+    def add_digests(history):
+        """为缺少内容摘要的条目补上 digest 字段"""
+        for entry in history:
+            if "digest" not in entry:
+                entry["digest"] = entry_digest(entry)
+
+    def migrate_inline_images(self, history):
+        """把旧格式中内嵌的 base64 图片转存到 blob 目录，返回是否有改动"""
+        changed = False
+        for i, entry in enumerate(history):
+            if isinstance(entry, dict) and entry.get("type") == "image" and "data" in entry:
+                try:
+                    history[i] = self.make_image_entry(base64.b64decode(entry["data"]))
+                    changed = True
+                except Exception as e:
+                    print(f"[ERROR] 迁移图片失败: {e}")
+        return changed
+
+    def make_image_entry(self, png_bytes, width=None, height=None, thumb_bytes=None,
+                         image_format="png", phash=None):
+        """暂存图片 blob（及可选的缩略图），返回只包含哈希和元数据的历史项
+
+        blob 在下一次 save() 时才写盘。非 PNG 图片在条目中记录 "format"，
+        phash 为感知哈希（见 image_hash.dhash），只在开启近似重复替换时保存。
+        """
+        if width is None or height is None:
+            width, height = png_size(png_bytes)
+        digest = self.blob_store.stage(png_bytes, IMAGE_SUFFIXES[image_format])
+        entry = {
+            "type": "image",
+            "blob": digest,
+            "size": len(png_bytes),
+            "width": width,
+            "height": height,
+        }
+        if image_format != "png":
+            entry["format"] = image_format
+        if thumb_bytes:
+            entry["thumb"] = self.blob_store.stage(thumb_bytes)
+        if phash and self.near_duplicate_distance is not None:
+            entry["phash"] = phash
+        return entry
+
+    @staticmethod
+    def image_suffix(entry):
+        return IMAGE_SUFFIXES.get(entry.get("format", "png"), ".png")
+
+    def read_image(self, entry):
+        """读取图片项对应的已压缩图片数据（PNG/WebP 等）"""
+        return self.blob_store.read(entry["blob"], self.image_suffix(entry))
+
+    def image_path(self, entry):
+        """图片项对应的 blob 文件路径"""
+        return self.blob_store.path(entry["blob"], self.image_suffix(entry))
+
+    def request_save(self):
+        """请求持久化：有后台写入线程时交给它合并写入，否则立即写入"""
+        if self.writer is not None:
+            self.writer.request()
+        else:
+            self.save()
+
     def save(self):
-        """保存历史记录到文件"""
+        """把暂存的 blob 和待写记录交给存储后端；需要时在后台压缩"""
         try:
-            with self.history_lock:
-                data = self.history.copy()
-            
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            with self.save_lock, METRICS.timer("history.save"):
+                # 先写 blob，保证日志里引用的图片一定已经在磁盘上
+                self.blob_store.flush()
+                with self.history_lock:
+                    records, self.pending_records = self.pending_records, []
+                    snapshot = None
+                    cleared = any(r["op"] == "clear" for r in records)
+                    # 占位条目还没补齐时不压缩，避免把预览写成正文、并保持文件偏移有效
+                    if not self.loading and (cleared or self.storage.needs_compaction(len(self.history))):
+                        snapshot = self.history.copy()
+                        started = time.time()
+
+                self.storage.append(records)
+                METRICS.incr("history.records_saved", len(records))
+                if snapshot is not None:
+                    self.storage.compact_async(snapshot, lambda: self.collect_blobs(started))
         except Exception as e:
             print(f"[ERROR] 保存历史记录失败: {e}")
 
+    def collect_blobs(self, started):
+        """删除已不在历史记录中的图片 blob"""
+        try:
+            live = self.storage.blob_refs(self.get_copy())
+            self.blob_store.gc(live, older_than=started)
+        except Exception as e:
+            print(f"[ERROR] 清理图片文件失败: {e}")
+
     def add_item(self, entry):
         """添加新项到历史记录
-        entry: {"type": "text"|"image", "data": str}
+        entry: {"type": "text", "data": str}
+             | {"type": "files", "data": 每行一个路径}
+             | {"type": "image", "blob": sha256, "size": int, "width": int, "height": int}
+        加入时会补上 "digest" 字段（内容摘要），大文本会被压缩（见 compress_text_entry）。
         """
-        if not entry:
+        entry = self.prepare_entry(entry)
+        if entry is None:
             return False
+        digest = entry["digest"]
+        now = round(time.time(), 3)
+        entry = HistoryEntry(entry, time=now)
+
+        with self.history_lock:
+            # 避免和最新项重复
+            if self.history and self.history[0].get("digest") == digest:
+                return False
+
+            entry_id = self.digest_index.get(digest)
+            if entry_id is not None:
+                # 历史中已有相同内容：移到最前面，不再保存第二份
+                index = self.history_ids.index(entry_id)
+                moved = self.history.pop(index)
+                moved["time"] = now  # 保留时间从最近一次复制算起
+                moved["copies"] = moved.get("copies", 1) + 1  # 复制次数，用于搜索排序
+                self.history.insert(0, moved)
+                self.history_ids.insert(0, self.history_ids.pop(index))
+                queue = self.evictable[entry_kind(moved)]
+                if entry_id in queue:
+                    queue.move_to_end(entry_id)
+                self.pending_records.append(
+                    {"op": "move", "index": index, "digest": digest, "time": now,
+                     "copies": moved["copies"]})
+                records = self.enforce_policy()
+                self.pending_records.extend(records)
+                self.version += 1
+                self.publish([Moved(self.version, index, 0, moved)] + self.removal_events(records))
+                return True
+
+            replaced = self.replace_near_duplicate(entry)
+            self.history.insert(0, entry)
+            self.history_ids.insert(0, self.index_entry(entry))
+            self.pending_records.append({"op": "insert", "entry": entry})
+            records = self.enforce_policy()
+            self.pending_records.extend(records)
+            self.version += 1
+            self.publish(self.removal_events(replaced) + [Inserted(self.version, 0, [entry])]
+                         + self.removal_events(records))
+        return True
+
+    def replace_near_duplicate(self, entry):
+        """新图片与窗口内某张同尺寸图片近似重复时，删除旧条目，新条目继承其复制次数和固定状态
+
+        调用方需持有 history_lock；返回删除记录（已加入 pending_records），没有近似重复时返回 []。
+        """
+        if self.near_duplicate_distance is None or not entry.get("phash"):
+            return []
+        for entry_id in self.phash_index.near(int(entry["phash"], 16), self.near_duplicate_distance):
+            index = self.history_ids.index(entry_id)
+            old = self.history[index]
+            if (old.get("width"), old.get("height")) != (entry.get("width"), entry.get("height")):
+                continue
+            self.unindex_entry(entry_id, old)
+            del self.history[index]
+            del self.history_ids[index]
+            entry["copies"] = old.get("copies", 1) + 1
+            if old.get("pinned"):
+                entry["pinned"] = True
+            METRICS.incr("history.near_duplicates")
+            records = [{"op": "remove", "index": index, "digest": old.get("digest")}]
+            self.pending_records.extend(records)
+            return records
+        return []
+
+    def prepare_entry(self, entry):
+        """规范化待添加的条目：兼容旧的字符串格式，补上摘要并压缩；空内容返回 None"""
+        if not entry:
+            return None
 
         if isinstance(entry, str):
             # 向下兼容旧格式
             entry = {"type": "text", "data": entry}
 
-        if entry.get("type") == "text" and (not entry.get("data") or entry.get("data").strip() == ""):
-            return False
+        if entry.get("type") in ("text", "files") and (not entry.get("data") or entry.get("data").strip() == ""):
+            return None
+
+        if "digest" not in entry:
+            entry = dict(entry, digest=entry_digest(entry))
+        return self.compress_entry(entry)
+
+    # ---------- 批量操作 ----------
+
+    def add_items(self, entries):
+        """批量添加（如导入），按顺序依次插到最前面，返回添加的条数
 
+        与 add_item() 不同，已有相同内容的条目（包括存储中内存窗口之外的）直接跳过而不是移到最前面；
+        条目自带的 time/copies/pinned 保留。一次持锁完成，只发布一个 Reset 事件。
+        """
+        now = round(time.time(), 3)
+        prepared = [HistoryEntry(e) if "time" in e else HistoryEntry(e, time=now)
+                    for e in (self.prepare_entry(e) for e in entries) if e is not None]
+        # 内存窗口之外已有的内容（SQLite 后端）；先写入待写记录，刚删除的条目才不会被当成已有
+        self.sync_storage()
+        known = self.storage.known_digests(e["digest"] for e in prepared)
         with self.history_lock:
-            # 避免和最新项重复
-            if self.history and self.history[0] == entry:
-                return False
+            added = []
+            for entry in prepared:
+                if entry["digest"] in self.digest_index or entry["digest"] in known:
+                    continue
+                added.append((entry, self.index_entry(entry)))
+            if not added:
+                return 0
+            added.reverse()  # 最后一个最新
+            self.history[0:0] = [entry for entry, _ in added]
+            self.history_ids[0:0] = [entry_id for _, entry_id in added]
+            records = [{"op": "insert", "entry": entry} for entry, _ in reversed(added)]
+            records.extend(self.enforce_policy())
+            self.pending_records.extend(records)
+            self.version += 1
+            self.publish([Reset(self.version)])
+        return len(added)
 
-            self.history.insert(0, entry)
-            if len(self.history) > self.max_items:
-                del self.history[self.max_items:]
+    def iter_entries(self, query=None, predicate=None, oldest_first=False, batch=500):
+        """逐条生成满足条件的条目（包括内存窗口之外的），默认最新在前，用于导出
+
+        内存窗口取一次快照，存储中更早的条目分批读取，内存占用与总条数无关。
+        窗口中的占位条目原样返回，需要完整内容时调用 get_full()。
+        """
+        match = entry_matcher(query, predicate)
+        self.sync_storage()
+        with self.history_lock:
+            window = list(self.history)
+            digests = set(self.digest_index)
+        older = ()
+        if self.storage.count() > len(window):
+            older = (e for e in self.storage.scan(batch, oldest_first) if e.get("digest") not in digests)
+        parts = (older, reversed(window)) if oldest_first else (window, older)
+        for part in parts:
+            for entry in part:
+                if match(entry):
+                    yield entry
+
+    def delete_where(self, query=None, predicate=None):
+        """删除满足条件的全部条目（包括内存窗口之外的），返回删除的条数
+
+        一次持锁完成，记录由下一次保存一起写入。只删了窗口内的条目时发布 Removed 事件，
+        否则发布 Reset。
+        """
+        match = entry_matcher(query, predicate)
+        self.sync_storage()
+        with self.history_lock:
+            # 先查存储：窗口内的条目移出摘要索引后就分不清了
+            outside = self.storage_matches(match)
+            records = []
+            keep, keep_ids = [], []
+            # 从尾部往前，每条记录的 index 在按顺序重放时都有效
+            for i in range(len(self.history) - 1, -1, -1):
+                entry, entry_id = self.history[i], self.history_ids[i]
+                if match(entry):
+                    self.unindex_entry(entry_id, entry)
+                    records.append({"op": "remove", "index": i, "digest": entry.get("digest")})
+                else:
+                    keep.append(entry)
+                    keep_ids.append(entry_id)
+            keep.reverse()
+            keep_ids.reverse()
+            events = [Removed(self.version + 1, r["index"], 1) for r in records]
+            records.extend({"op": "remove", "index": None, "digest": e.get("digest")} for e in outside)
+            if not records:
+                return 0
+            self.history, self.history_ids = keep, keep_ids
+            self.pending_records.extend(records)
             self.version += 1
-        return True
+            self.publish([Reset(self.version)] if outside else events)
+        return len(records)
+
+    def pin_where(self, pinned=True, query=None, predicate=None):
+        """固定或取消固定满足条件的全部条目，返回改变的条数（一次持锁，规则同 delete_where）"""
+        match = entry_matcher(query, predicate)
+        self.sync_storage()
+        with self.history_lock:
+            records = []
+            events = []
+            for index, entry in enumerate(self.history):
+                if bool(entry.get("pinned")) != pinned and match(entry):
+                    if pinned:
+                        entry["pinned"] = True
+                    else:
+                        entry.pop("pinned", None)
+                    records.append({"op": "pin", "digest": entry.get("digest"), "pinned": pinned,
+                                    "index": index})
+                    events.append(Changed(self.version + 1, index, entry))
+            outside = [e for e in self.storage_matches(match) if bool(e.get("pinned")) != pinned]
+            records.extend({"op": "pin", "digest": e.get("digest"), "pinned": pinned} for e in outside)
+            if not records:
+                return 0
+            if events:
+                self.rebuild_evictable()
+            self.version += 1
+            removed = self.enforce_policy() if not pinned else []
+            self.pending_records.extend(records + removed)
+            if outside:
+                self.publish([Reset(self.version)])
+            else:
+                self.publish(events + self.removal_events(removed))
+        return len(records)
+
+    def storage_matches(self, match):
+        """存储中内存窗口之外、满足条件的条目（调用方需持有 history_lock 并已 sync_storage）"""
+        if self.storage.count() <= len(self.history):
+            return []
+        window = self.digest_index
+        return [e for e in self.storage.scan() if e.get("digest") not in window and match(e)]
+
+    # ---------- 变化通知 ----------
+
+    def subscribe(self, callback):
+        """订阅变化事件（history_events 中的类型），返回 callback 便于之后取消
+
+        回调在产生变化的线程中、持有 history_lock 时按发生顺序调用，
+        必须立即返回且不能再调用 HistoryManager；GUI 通过排队的 Qt 信号转发到主线程。
+        """
+        with self.subscribers_lock:
+            self.subscribers = self.subscribers + [callback]
+        return callback
+
+    def unsubscribe(self, callback):
+        with self.subscribers_lock:
+            self.subscribers = [c for c in self.subscribers if c is not callback]
+
+    def publish(self, events):
+        """把事件依次发给所有订阅者（调用方需持有 history_lock，以保证顺序）"""
+        for callback in self.subscribers:
+            for event in events:
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"[ERROR] 变化通知失败: {e}")
+
+    def removal_events(self, records):
+        """enforce_policy() 的记录对应的事件；只移出内存窗口的 evict 不算删除"""
+        return [Removed(self.version, r["index"], 1) for r in records if r["op"] == "remove"]
+
+    def enforce_policy(self):
+        """按淘汰策略移出条目（调用方需持有 history_lock），返回要写入后端的记录
+
+        后端保留移出窗口的条目时（storage.keeps_evicted，如 SQLite）只从尾部移出，
+        窗口始终是存储的前缀；否则移出即删除，跳过固定条目，字节超预算时只淘汰超出的那一类。
+        候选只看各类型可淘汰队列中最旧的一条，固定条目和另一类条目再多也不需要逐个跳过；
+        删除时仍要在窗口列表中定位和移动，这部分是 C 层面的 O(窗口)。
+        """
+        policy = self.policy
+        now = time.time()
+        if self.storage.keeps_evicted:
+            evicted = 0
+            while self.history:
+                entry = self.history[-1]
+                if not (policy.count_over(len(self.history)) or policy.over_kinds(self.bytes_used)
+                        or policy.expired(entry, now)):
+                    break
+                self.unindex_entry(self.history_ids[-1], entry)
+                self.history.pop()
+                self.history_ids.pop()
+                evicted += 1
+            return [{"op": "evict", "count": evicted}] if evicted else []
+
+        records = []
+        while True:
+            count_over = policy.count_over(len(self.history))
+            over_kinds = policy.over_kinds(self.bytes_used)
+            victim = None  # (位置, id)，多个类型都可淘汰时取更靠近尾部的
+            for kind, queue in self.evictable.items():
+                if not queue:
+                    continue
+                entry_id, entry = next(iter(queue.items()))
+                if count_over or kind in over_kinds or policy.expired(entry, now):
+                    index = self.history_ids.index(entry_id)
+                    if victim is None or index > victim[0]:
+                        victim = (index, entry_id)
+            if victim is None:
+                break
+            index, entry_id = victim
+            entry = self.history[index]
+            self.unindex_entry(entry_id, entry)
+            del self.history[index]
+            del self.history_ids[index]
+            records.append({"op": "remove", "index": index, "digest": entry.get("digest")})
+        return records
+
+    def set_pinned(self, entry, pinned=True):
+        """固定条目（不会被淘汰策略移除）或取消固定"""
+        digest = entry.get("digest")
+        with self.history_lock:
+            targets = [entry]
+            entry_id = self.digest_index.get(digest)
+            if entry_id is not None:
+                targets.append(self.history[self.history_ids.index(entry_id)])
+            for target in targets:
+                if pinned:
+                    target["pinned"] = True
+                else:
+                    target.pop("pinned", None)
+            self.pending_records.append({"op": "pin", "digest": digest, "pinned": pinned})
+            if entry_id is not None:
+                self.rebuild_evictable()
+            self.version += 1
+            events = []
+            if entry_id is not None:
+                index = self.history_ids.index(entry_id)
+                events.append(Changed(self.version, index, self.history[index]))
+            records = self.enforce_policy() if not pinned else []
+            self.pending_records.extend(records)
+            self.publish(events + self.removal_events(records))
+
+    def index_entry(self, entry):
+        """为条目分配 id 并加入搜索索引（调用方需持有 history_lock）"""
+        entry_id = self.next_id
+        self.next_id += 1
+        self.search_index.add(entry_id, entry_search_key(entry))
+        self.digest_index.setdefault(entry["digest"], entry_id)
+        self.entries_by_id[entry_id] = entry
+        if self.near_duplicate_distance is not None and entry.get("phash"):
+            self.phash_index.add(entry_id, int(entry["phash"], 16))
+        self.bytes_used[entry_kind(entry)] += entry_bytes(entry)
+        if not entry.get("pinned"):
+            # 新条目总是插在最前面，即最新
+            self.evictable[entry_kind(entry)][entry_id] = entry
+        return entry_id
+
+    def rebuild_evictable(self):
+        """按窗口顺序重建可淘汰队列，用于加载和固定状态改变之后（调用方需持有 history_lock）"""
+        for queue in self.evictable.values():
+            queue.clear()
+        for entry_id, entry in zip(reversed(self.history_ids), reversed(self.history)):
+            if not entry.get("pinned"):
+                self.evictable[entry_kind(entry)][entry_id] = entry
+
+    def unindex_entry(self, entry_id, entry):
+        """把条目移出搜索索引和摘要索引（调用方需持有 history_lock）"""
+        self.search_index.remove(entry_id)
+        self.entries_by_id.pop(entry_id, None)
+        self.phash_index.remove(entry_id)
+        self.evictable[entry_kind(entry)].pop(entry_id, None)
+        self.bytes_used[entry_kind(entry)] -= entry_bytes(entry)
+        if self.digest_index.get(entry.get("digest")) == entry_id:
+            del self.digest_index[entry["digest"]]
+
+    def search(self, text, limit=100):
+        """搜索包含 text 的条目，最新在前
+
+        内存窗口内的条目走倒排索引；存储后端中更早的条目最多再取 limit 条。
+        """
+        with self.history_lock:
+            ids = self.search_index.search(text)
+            result = [e for i, e in zip(self.history_ids, self.history) if i in ids]
+            window = len(self.history)
+        if self.storage.count() > window:
+            self.sync_storage()
+            result.extend(HistoryEntry(e) for e in self.storage.search(text, window, limit))
+        return result
+
+    def search_candidates(self, terms, batch=500):
+        """模糊搜索的候选，按时间倒序分批生成 [(条目, 小写搜索键), ...]
+
+        先是内存窗口内的全部条目（搜索键取自倒排索引，不重复计算），
+        再是存储后端中更早的、按顺序包含各词全部字符的文本条目。
+        只在复制快照时持锁，调用方可以在批与批之间放弃。
+        """
+        with self.history_lock:
+            keys = self.search_index.keys
+            window = [(e, keys.get(i, "")) for i, e in zip(self.history_ids, self.history)]
+        for start in range(0, len(window), batch):
+            yield window[start:start + batch]
+        if self.storage.count() > len(window):
+            self.sync_storage()
+            rows = []
+            for entry in self.storage.fuzzy_candidates(terms, len(window), batch):
+                rows.append((HistoryEntry(entry), entry_search_key(entry)))
+                if len(rows) >= batch:
+                    yield rows
+                    rows = []
+            if rows:
+                yield rows
 
     def clear(self):
         """清空历史记录"""
         with self.history_lock:
             self.history.clear()
+            self.history_ids.clear()
+            self.search_index.clear()
+            self.digest_index.clear()
+            self.entries_by_id.clear()
+            self.phash_index.clear()
+            for queue in self.evictable.values():
+                queue.clear()
+            self.bytes_used = {"text": 0, "image": 0}
+            self.pending_records = [{"op": "clear"}]
             self.version += 1
+            self.publish([Cleared(self.version)])
 
     def get_copy(self):
         """获取历史记录副本"""
@@ -88,3 +758,46 @@ class HistoryManager:
         """获取历史记录长度"""
         with self.history_lock:
             return len(self.history)
+
+    def get_total(self):
+        """总条数（可能多于内存中的条数）：存储中的条数加上还在等待写入的插入和删除"""
+        count = self.storage.count()
+        with self.history_lock:
+            for r in self.pending_records:
+                op = r["op"]
+                if op == "insert":
+                    count += 1
+                elif op == "remove":
+                    count -= 1
+                elif op == "evict" and not self.storage.keeps_evicted:
+                    count -= r["count"]
+                elif op == "clear":
+                    count = 0
+            return max(len(self.history), count)
+
+    def get_head(self, limit):
+        """返回 (version, 最新的 limit 条)，两者一致，用于订阅方建立初始状态"""
+        while True:
+            with self.history_lock:
+                if limit <= len(self.history) or self.storage.count() <= len(self.history):
+                    return self.version, self.history[:limit]
+                version = self.version
+            self.sync_storage()
+            entries = [HistoryEntry(e) for e in self.storage.page(0, limit)]
+            # 读取期间有新的变化时，结果可能已包含之后事件的内容，重新读取
+            with self.history_lock:
+                if self.version == version:
+                    return version, entries
+
+    def get_page(self, offset, limit):
+        """分页获取历史记录，最新在前；超出内存窗口的部分从存储后端读取"""
+        with self.history_lock:
+            if offset + limit <= len(self.history) or self.storage.count() <= len(self.history):
+                return self.history[offset:offset + limit]
+        self.sync_storage()
+        return [HistoryEntry(e) for e in self.storage.page(offset, limit)]
+
+    def sync_storage(self):
+        """读取内存窗口之外的条目前，先把尚未写入的记录写进后端，否则分页会错位"""
+        if self.pending_records:
+            self.save()
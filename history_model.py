@@ -0,0 +1,263 @@
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QSize, pyqtSignal
+from PyQt6.QtGui import QPixmap
+from PyQt6.QtWidgets import QStyledItemDelegate
+
+from history_entry import entry_preview
+from history_events import Inserted, Removed, Moved, Changed, Cleared
+
+
+def thumbnail_size(entry, box=(128, 100)):
+    """根据条目记录的原图尺寸计算缩略图尺寸，不需要加载图片"""
+    width, height = entry.get("width") or 0, entry.get("height") or 0
+    if width <= 0 or height <= 0:
+        return box
+    scale = min(box[0] / width, box[1] / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def load_blob_pixmap(blob_store, digest, suffix=None):
+    """加载 blob 为 QPixmap：已写盘的直接按路径读取，尚在内存中的从数据加载"""
+    data = blob_store.pending_data(digest)
+    if data is None:
+        return QPixmap(blob_store.path(digest, suffix))
+    pixmap = QPixmap()
+    pixmap.loadFromData(data)
+    return pixmap
+
+
+def is_image(entry):
+    return isinstance(entry, dict) and entry.get("type") == "image"
+
+
+class HistoryListModel(QAbstractListModel):
+    """历史记录列表模型
+
+    只保存已加载的行，滚动到底部时由视图通过 canFetchMore/fetchMore 按页加载。
+    HistoryManager 的变化事件经 apply_event() 逐条应用到已加载的行上，
+    新剪贴项只插入一行，不重建整个列表。
+    显示文本在视图第一次请求该行时才计算；缩略图取自共享的 PixmapCache，
+    优先读取采集时已生成的缩略图 blob。
+    有 searcher（FuzzySearcher）时搜索在后台线程进行，结果分批送回并整体替换列表；
+    否则在当前线程做子串搜索。
+    """
+
+    search_results = pyqtSignal(int, object, bool)  # 搜索序号, 结果, 是否最终结果（来自搜索线程）
+    search_updated = pyqtSignal(bool)  # 搜索结果已更新，参数为是否最终结果
+
+    def __init__(self, history_manager, pixmap_cache, page_size=100, thumb_size=(128, 100),
+                 parent=None, searcher=None):
+        super().__init__(parent)
+        self.history_manager = history_manager
+        self.searcher = searcher
+        self.search_token = 0
+        self.searching = False
+        self.search_results.connect(self.on_search_results, Qt.ConnectionType.QueuedConnection)
+        self.pixmap_cache = pixmap_cache
+        self.page_size = page_size
+        self.thumb_size = thumb_size
+        self.entries = []
+        self.query = ""
+        self.base_version = 0  # 已加载的行对应的 HistoryManager.version，更早的事件已包含在内
+        self.version = 0       # 最近应用的事件的 version
+        self.tail_stale = False  # 内存窗口之外的已加载行需要重新读取
+
+    # ---------- Qt 模型接口 ----------
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.entries):
+            return None
+        entry = self.entries[index.row()]
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            text = self.display_text(entry)
+            return "📌 " + text if entry.get("pinned") else text
+        if role == Qt.ItemDataRole.DecorationRole and is_image(entry):
+            return self.thumbnail(entry)
+        if role == Qt.ItemDataRole.UserRole:
+            return entry
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.query:
+            return False
+        # 还有事件没送到时按偏移分页会错位，等事件应用完再加载
+        if self.version != self.history_manager.version:
+            return False
+        return len(self.entries) < self.history_manager.get_total()
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        page = self.history_manager.get_page(len(self.entries), self.page_size)
+        if not page:
+            return
+        start = len(self.entries)
+        self.beginInsertRows(QModelIndex(), start, start + len(page) - 1)
+        self.entries.extend(page)
+        self.endInsertRows()
+
+    # ---------- 数据更新 ----------
+
+    def set_query(self, text):
+        self.query = text.strip()
+        self.reload()
+
+    def reload(self):
+        """重新加载第一页（或搜索结果）"""
+        if self.query and self.searcher is not None:
+            self.start_search()
+            return
+        if self.searching:
+            # 清空了搜索框：丢弃还在进行的搜索
+            self.searcher.cancel()
+            self.search_token += 1
+            self.searching = False
+        if self.query:
+            entries = self.history_manager.search(self.query, self.page_size)
+        else:
+            self.base_version, entries = self.history_manager.get_head(self.page_size)
+            self.version = self.base_version
+        self.set_entries(entries)
+
+    def start_search(self):
+        self.search_token += 1
+        token = self.search_token
+        self.searching = True
+        self.searcher.submit(self.query,
+                             lambda results, done: self.search_results.emit(token, results, done))
+
+    def on_search_results(self, token, results, done):
+        if token != self.search_token:
+            return  # 已被新的查询取代
+        self.searching = not done
+        self.set_entries(results)
+        self.search_updated.emit(done)
+
+    def set_entries(self, entries):
+        self.beginResetModel()
+        self.entries = entries
+        self.tail_stale = False
+        self.endResetModel()
+
+    def apply_event(self, event):
+        """应用一条 HistoryManager 变化事件（在 GUI 线程中按发布顺序调用）"""
+        if event.version <= self.base_version:
+            return  # 已包含在 reload() 读取的数据里
+        self.version = event.version
+        if self.query:
+            # 搜索结果由索引重新计算
+            self.reload()
+            return
+
+        if isinstance(event, Inserted):
+            self.insert_rows(event.index, event.entries)
+        elif isinstance(event, Moved):
+            self.move_row(event.source, event.dest, event.entry)
+        elif isinstance(event, Removed):
+            self.remove_rows(event.index, event.count)
+        elif isinstance(event, Changed):
+            if event.index < len(self.entries):
+                self.entries[event.index] = event.entry
+                index = self.index(event.index)
+                self.dataChanged.emit(index, index)
+        elif isinstance(event, Cleared):
+            self.set_entries([])
+        else:
+            self.reload()
+            return
+        self.refresh_tail()
+
+    def insert_rows(self, row, entries):
+        if not entries or row > len(self.entries):
+            return  # 还没加载到这里，之后分页时再读取
+        self.beginInsertRows(QModelIndex(), row, row + len(entries) - 1)
+        self.entries[row:row] = entries
+        self.endInsertRows()
+        # 超出内存窗口、从存储分页读取的行：同样内容可能已被移到头部，或被存储按淘汰策略删除
+        if len(self.entries) > self.history_manager.get_length():
+            self.tail_stale = True
+
+    def refresh_tail(self):
+        """重新读取内存窗口之外的已加载行
+
+        还有事件没送到时不读取：存储里已经包含之后的变化，那些事件到达后会再插入一次。
+        等事件全部应用完（version 与 HistoryManager 一致）再读。
+        """
+        if not self.tail_stale or self.version != self.history_manager.version:
+            return
+        window = self.history_manager.get_length()
+        count = len(self.entries) - window
+        tail = self.history_manager.get_page(window, count) if count > 0 else []
+        if self.version != self.history_manager.version:
+            return  # 读取期间又有变化，等对应的事件到达后再读
+        self.tail_stale = False
+        if count <= 0:
+            return
+        self.remove_rows(window, count)
+        if tail:
+            self.beginInsertRows(QModelIndex(), window, window + len(tail) - 1)
+            self.entries[window:window] = tail
+            self.endInsertRows()
+
+    def move_row(self, source, dest, entry):
+        if source < len(self.entries):
+            if source != dest:
+                self.beginMoveRows(QModelIndex(), source, source, QModelIndex(),
+                                   dest if dest < source else dest + 1)
+                self.entries.insert(dest, self.entries.pop(source))
+                self.endMoveRows()
+        else:
+            # 原位置还没有加载，相当于在 dest 插入
+            self.insert_rows(dest, [entry])
+
+    def remove_rows(self, row, count):
+        last = min(row + count, len(self.entries)) - 1
+        if row > last:
+            return
+        self.beginRemoveRows(QModelIndex(), row, last)
+        del self.entries[row:last + 1]
+        self.endRemoveRows()
+
+    # ---------- 按需计算的显示数据 ----------
+
+    def display_text(self, entry):
+        # HistoryEntry 第一次显示时算好并缓存显示文本
+        preview = getattr(entry, "preview", None)
+        return preview if preview is not None else entry_preview(entry)
+
+    def thumbnail(self, entry):
+        return self.pixmap_cache.get_or_load(("thumb", entry.get("blob")),
+                                             lambda: self.load_thumbnail(entry))
+
+    def load_thumbnail(self, entry):
+        blob_store = self.history_manager.blob_store
+        if entry.get("thumb"):
+            # 采集时已在后台线程生成，直接读取小图
+            return load_blob_pixmap(blob_store, entry["thumb"])
+        # 旧条目没有缩略图，只能从原图缩放
+        return load_blob_pixmap(blob_store, entry["blob"],
+                                self.history_manager.image_suffix(entry)).scaled(
+            *self.thumb_size,
+            Qt.AspectRatioMode.KeepAspectRatio,
+            Qt.TransformationMode.SmoothTransformation
+        )
+
+
+class HistoryItemDelegate(QStyledItemDelegate):
+    """根据条目元数据给出行高，布局时不需要解码图片"""
+
+    def __init__(self, thumb_size=(128, 100), parent=None):
+        super().__init__(parent)
+        self.thumb_size = thumb_size
+
+    def sizeHint(self, option, index):
+        entry = index.data(Qt.ItemDataRole.UserRole)
+        width = option.rect.width()
+        if is_image(entry):
+            _, thumb_height = thumbnail_size(entry, self.thumb_size)
+            return QSize(width, max(thumb_height + 32, 80))  # 至少80px高
+        # 文本项使用默认高度
+        return QSize(width, 60)
@@ -0,0 +1,394 @@
+import os
+import queue
+import socket
+import sys
+import tempfile
+import threading
+from multiprocessing.connection import Client, Listener
+
+from blob_store import BlobStore
+from fuzzy_search import FuzzySearcher
+from history_manager import HistoryManager
+from history_transfer import export_history, import_history
+
+# 采集守护进程与界面/命令行客户端之间的本机 IPC
+#
+# 连接用 multiprocessing.connection（Windows 命名管道 / Unix 域套接字），
+# 握手时校验 authkey，只有能读到密钥文件的本机用户可以连接。
+# 请求为 (操作, 参数元组)，回复为 ("ok", 结果) 或 ("error", 信息)。
+# 发送 ("subscribe", (角色,)) 后该连接只用于推送：("event", 变化事件) 和 ("show", 窗口句柄)。
+
+
+def default_address():
+    """默认的 IPC 地址：Windows 上为命名管道，其他系统为临时目录中的 Unix 域套接字"""
+    user = os.environ.get("USERNAME") or os.environ.get("USER") or "user"
+    if sys.platform == "win32":
+        return rf"\\.\pipe\cozy-clipboard-{user}"
+    return os.path.join(tempfile.gettempdir(), f"cozy-clipboard-{user}.sock")
+
+
+def server_running(address):
+    """address 上是否已有守护进程在监听（只尝试连接，不握手）"""
+    if address.startswith("\\\\"):
+        import _winapi
+
+        try:
+            _winapi.WaitNamedPipe(address, 0)
+        except OSError as e:
+            return e.winerror != 2  # ERROR_FILE_NOT_FOUND：没有进程创建这个管道
+        return True
+    if not os.path.exists(address):
+        return False
+    sock = socket.socket(socket.AF_UNIX)
+    sock.settimeout(1)
+    try:
+        sock.connect(address)
+    except (ConnectionRefusedError, FileNotFoundError):
+        return False  # 上次异常退出留下的套接字文件
+    except OSError:
+        return True
+    finally:
+        sock.close()
+    return True
+
+
+def create_authkey(path):
+    """生成新的随机密钥并写入 path（仅当前用户可读），每次守护进程启动时更换"""
+    key = os.urandom(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def read_authkey(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class HistoryServer:
+    """在守护进程中对外提供 HistoryManager 的查询和订阅
+
+    每个连接一个线程；订阅连接另有一个发送队列，因为变化事件在持有 history_lock 时发布，
+    不能在回调里直接写管道。客户端断开后自动取消订阅。
+    """
+
+    OPS = ("info", "head", "page", "search", "fuzzy", "get_full", "pending_blob",
+           "add", "set_pinned", "save", "clear", "delete", "pin", "export", "import")
+
+    def __init__(self, history_manager, address, authkey, search_options=None):
+        self.history_manager = history_manager
+        self.address = address
+        self.authkey = authkey
+        self.search_options = search_options or {}  # FuzzySearcher 的打分参数
+        self.listener = None
+        self.subscribers = {}  # 连接 -> (角色, 发送队列)
+        self.lock = threading.Lock()
+        self.running = False
+
+    def start(self):
+        if server_running(self.address):
+            raise RuntimeError(f"已有采集进程在运行: {self.address}")
+        if not self.address.startswith("\\\\") and os.path.exists(self.address):
+            # 上次异常退出留下的套接字文件
+            os.remove(self.address)
+        self.listener = Listener(self.address, authkey=self.authkey)
+        self.running = True
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        with self.lock:
+            queues = [q for _, q in self.subscribers.values()]
+        for q in queues:
+            q.put(None)
+        if self.listener is not None:
+            try:
+                self.listener.close()
+            except OSError:
+                pass
+
+    def accept_loop(self):
+        while self.running:
+            try:
+                conn = self.listener.accept()
+            except (EOFError, BrokenPipeError, ConnectionResetError):
+                continue  # 握手前就断开，如另一个进程用 server_running() 探测
+            except Exception as e:
+                if not self.running:
+                    break
+                # 密钥不对或握手中断，只影响这一个连接
+                print(f"[ERROR] 接受客户端连接失败: {e}")
+                continue
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def serve(self, conn):
+        try:
+            while self.running:
+                op, args = conn.recv()
+                if op == "subscribe":
+                    conn.send(("ok", None))
+                    self.stream(conn, *args)
+                    return
+                if op not in self.OPS:
+                    conn.send(("error", f"未知操作: {op}"))
+                    continue
+                try:
+                    reply = ("ok", getattr(self, "op_" + op)(*args))
+                except Exception as e:
+                    reply = ("error", str(e))
+                conn.send(reply)
+        except (EOFError, OSError):
+            pass  # 客户端断开
+        finally:
+            conn.close()
+
+    def stream(self, conn, role="client"):
+        """把变化事件和命令推送给订阅的客户端，直到连接断开"""
+        messages = queue.Queue()
+
+        def on_event(event):
+            messages.put(("event", event))
+
+        with self.lock:
+            self.subscribers[conn] = (role, messages)
+        self.history_manager.subscribe(on_event)
+        try:
+            while self.running:
+                try:
+                    message = messages.get(timeout=1)
+                except queue.Empty:
+                    # 订阅连接上客户端不再发送请求，可读即表示已断开
+                    if conn.poll():
+                        break
+                    continue
+                if message is None:
+                    break
+                conn.send(message)
+        except (EOFError, OSError):
+            pass
+        finally:
+            self.history_manager.unsubscribe(on_event)
+            with self.lock:
+                self.subscribers.pop(conn, None)
+
+    def request_show(self, hwnd):
+        """让已连接的界面显示窗口，hwnd 为粘贴目标；没有界面连接时返回 False"""
+        with self.lock:
+            queues = [q for role, q in self.subscribers.values() if role == "gui"]
+        for q in queues:
+            q.put(("show", hwnd))
+        return bool(queues)
+
+    # ---------------- 请求处理 ----------------
+
+    def op_info(self):
+        history_manager = self.history_manager
+        return {
+            "version": history_manager.version,
+            "total": history_manager.get_total(),
+            "length": history_manager.get_length(),
+            "blob_dir": os.path.abspath(history_manager.blob_store.root),
+            "pid": os.getpid(),
+        }
+
+    def op_head(self, limit):
+        return self.history_manager.get_head(limit)
+
+    def op_page(self, offset, limit):
+        return self.history_manager.get_page(offset, limit)
+
+    def op_search(self, text, limit):
+        return self.history_manager.search(text, limit)
+
+    def op_fuzzy(self, query, limit):
+        # 只借用打分逻辑，不启动线程；每个连接各自在自己的线程里搜索
+        searcher = FuzzySearcher(self.history_manager, limit, **self.search_options)
+        return searcher.search(query)
+
+    def op_get_full(self, entry):
+        return self.history_manager.get_full(entry)
+
+    def op_pending_blob(self, digest):
+        return self.history_manager.blob_store.pending_data(digest)
+
+    def op_add(self, entry):
+        added = self.history_manager.add_item(entry)
+        if added:
+            self.history_manager.request_save()
+        return added
+
+    def op_set_pinned(self, entry, pinned):
+        self.history_manager.set_pinned(entry, pinned)
+
+    def op_save(self):
+        self.history_manager.request_save()
+
+    def op_clear(self):
+        self.history_manager.clear()
+
+    def op_delete(self, query):
+        count = self.history_manager.delete_where(query)
+        self.history_manager.request_save()
+        return count
+
+    def op_pin(self, query, pinned):
+        count = self.history_manager.pin_where(pinned, query)
+        self.history_manager.request_save()
+        return count
+
+    def op_export(self, path, query, images):
+        # 路径由客户端给出绝对路径，文件由守护进程直接读写
+        return export_history(self.history_manager, path, query, images=images)
+
+    def op_import(self, path):
+        return import_history(self.history_manager, path)
+
+
+class RemoteBlobStore(BlobStore):
+    """客户端读取守护进程的 blob：已写盘的直接读文件，尚未写盘的向守护进程要"""
+
+    def __init__(self, remote, root):
+        super().__init__(root)
+        self.remote = remote
+
+    def pending_data(self, digest):
+        return self.remote.call("pending_blob", digest)
+
+
+class RemoteHistory:
+    """通过 IPC 访问守护进程中的 HistoryManager，提供界面和命令行用到的同名接口
+
+    请求在一条连接上串行收发；subscribe() 时另开一条订阅连接，由后台线程读取，
+    变化事件交给订阅者，"show" 等命令交给 on_command() 注册的回调。
+    连接断开时命令回调收到 ("closed", None)。
+    """
+
+    image_suffix = staticmethod(HistoryManager.image_suffix)
+
+    def __init__(self, address, authkey, role="client"):
+        self.address = address
+        self.authkey = authkey
+        self.role = role
+        self.conn = Client(address, authkey=authkey)
+        self.lock = threading.Lock()
+        info = self.call("info")
+        self.version = info["version"]
+        self.blob_store = RemoteBlobStore(self, info["blob_dir"])
+        self.startup_metrics = {}
+        self.subscribers = []
+        self.command_handlers = []
+        self.stream = None
+        self.closing = False  # 由 close() 主动断开时不报错
+
+    def call(self, op, *args):
+        with self.lock:
+            self.conn.send((op, args))
+            status, result = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(result)
+        return result
+
+    def close(self):
+        self.closing = True
+        self.conn.close()
+        if self.stream is not None:
+            self.stream.close()
+
+    # ---------------- 订阅 ----------------
+
+    def subscribe(self, callback):
+        self.subscribers = self.subscribers + [callback]
+        if self.stream is None:
+            self.stream = Client(self.address, authkey=self.authkey)
+            self.stream.send(("subscribe", (self.role,)))
+            self.stream.recv()
+            threading.Thread(target=self.read_stream, daemon=True).start()
+        return callback
+
+    def unsubscribe(self, callback):
+        self.subscribers = [c for c in self.subscribers if c is not callback]
+
+    def on_command(self, callback):
+        """callback(命令, 参数)：守护进程推送的命令，如 ("show", 窗口句柄)"""
+        self.command_handlers.append(callback)
+
+    def read_stream(self):
+        try:
+            while True:
+                kind, value = self.stream.recv()
+                if kind == "event":
+                    self.version = max(self.version, value.version)
+                    for callback in self.subscribers:
+                        callback(value)
+                else:
+                    for callback in self.command_handlers:
+                        callback(kind, value)
+        except (EOFError, OSError):
+            if not self.closing:
+                print("[ERROR] 与采集进程的连接已断开")
+        for callback in self.command_handlers:
+            callback("closed", None)
+
+    # ---------------- HistoryManager 接口 ----------------
+
+    def get_head(self, limit):
+        version, entries = self.call("head", limit)
+        self.version = max(self.version, version)
+        return version, entries
+
+    def get_page(self, offset, limit):
+        return self.call("page", offset, limit)
+
+    def get_total(self):
+        return self.call("info")["total"]
+
+    def get_length(self):
+        return self.call("info")["length"]
+
+    def search(self, text, limit=100):
+        return self.call("search", text, limit)
+
+    def fuzzy_search(self, query, limit=100):
+        return self.call("fuzzy", query, limit)
+
+    def get_full(self, entry):
+        if not isinstance(entry, dict) or not (entry.get("lazy") or entry.get("codec")):
+            return entry
+        return self.call("get_full", entry)
+
+    def read_image(self, entry):
+        return self.blob_store.read(entry["blob"], self.image_suffix(entry))
+
+    def image_path(self, entry):
+        return self.blob_store.path(entry["blob"], self.image_suffix(entry))
+
+    def add_item(self, entry):
+        return self.call("add", entry)
+
+    def set_pinned(self, entry, pinned=True):
+        if pinned:
+            entry["pinned"] = True
+        else:
+            entry.pop("pinned", None)
+        self.call("set_pinned", entry, pinned)
+
+    def request_save(self):
+        self.call("save")
+
+    def clear(self):
+        self.call("clear")
+
+
+class RemoteSearcher(FuzzySearcher):
+    """在守护进程中执行的模糊搜索，submit()/cancel() 的用法与 FuzzySearcher 相同
+
+    一次请求直接返回完整结果，没有中间结果；请求期间提交的新查询会让旧结果被丢弃。
+    """
+
+    def __init__(self, remote, limit=100, daemon=True):
+        super().__init__(remote, limit, daemon=daemon)
+
+    def search(self, query, cancelled=lambda: False, on_partial=None):
+        results = self.history_manager.fuzzy_search(query, self.limit)
+        return None if cancelled() else results
@@ -0,0 +1,141 @@
+import base64
+import json
+import os
+
+from blob_store import BlobStore
+
+# 导出文件为 NDJSON，第一行是文件头，之后每行一个条目，最旧在前（导入时依次插到最前面）：
+#     {"format": "cozy-clipboard", "version": 1, "images": "inline" | "sidecar"}
+#     {"type": "text", "data": "...", "time": ..., "copies": 2}
+#     {"type": "image", "blob": sha256, ..., "image_data": base64, "thumb_data": base64}
+# images 为 "sidecar" 时图片不写进文件，而是按哈希存放在 <文件名>.blobs/ 目录（与 BlobStore 的布局相同）。
+# 导出和导入都逐行处理，内存占用与条数无关。
+
+FORMAT = "cozy-clipboard"
+VERSION = 1
+IMAGE_MODES = ("inline", "sidecar")
+# 只在导出文件中使用的字段
+TRANSPORT_KEYS = ("image_data", "thumb_data")
+# 不导出的内部字段：摘要导入时重新计算
+INTERNAL_KEYS = ("digest", "lazy")
+
+
+def sidecar_dir(path):
+    return path + ".blobs"
+
+
+def export_history(history_manager, path, query=None, predicate=None, images="inline"):
+    """把满足条件的条目导出为 NDJSON，返回导出的条数
+
+    先写临时文件再替换，导出中途失败不会留下半个文件。
+    """
+    if images not in IMAGE_MODES:
+        raise ValueError(f"未知的图片导出方式: {images}")
+    sidecar = BlobStore(sidecar_dir(path)) if images == "sidecar" else None
+    count = 0
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="\n") as f:
+        f.write(json.dumps({"format": FORMAT, "version": VERSION, "images": images}) + "\n")
+        for entry in history_manager.iter_entries(query, predicate, oldest_first=True):
+            record = export_record(history_manager, history_manager.get_full(entry), sidecar)
+            if record is None:
+                continue
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def export_record(history_manager, entry, sidecar=None):
+    """条目对应的导出记录；图片数据读不到时返回 None"""
+    record = {k: v for k, v in entry.items() if k not in INTERNAL_KEYS}
+    if entry.get("type") != "image":
+        return record
+    blob_store = history_manager.blob_store
+    suffix = history_manager.image_suffix(entry)
+    data = blob_store.read(entry["blob"], suffix)
+    if data is None:
+        print(f"[ERROR] 图片文件不存在，已跳过: {entry['blob']}")
+        return None
+    thumb = blob_store.read(entry["thumb"]) if entry.get("thumb") else None
+    if thumb is None:
+        record.pop("thumb", None)
+    if sidecar is not None:
+        sidecar.put(data, entry["blob"], suffix)
+        if thumb is not None:
+            sidecar.put(thumb, entry["thumb"])
+    else:
+        record["image_data"] = base64.b64encode(data).decode("ascii")
+        if thumb is not None:
+            record["thumb_data"] = base64.b64encode(thumb).decode("ascii")
+    return record
+
+
+def import_history(history_manager, path, batch=1000):
+    """从 NDJSON 导入，返回 (添加条数, 跳过条数)
+
+    已有相同内容的条目跳过。每 batch 条调用一次 add_items() 并保存，
+    待写记录不会随文件大小无限增长。
+    """
+    added = skipped = 0
+    sidecar = None
+    pending = []
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print(f"[ERROR] 导入文件第 {lineno} 行损坏，已跳过")
+                skipped += 1
+                continue
+            if "format" in record:
+                # 文件头
+                if record.get("images") == "sidecar":
+                    sidecar = BlobStore(sidecar_dir(path))
+                continue
+            entry = import_record(history_manager, record, sidecar)
+            if entry is None:
+                skipped += 1
+                continue
+            pending.append(entry)
+            if len(pending) >= batch:
+                count = history_manager.add_items(pending)
+                added += count
+                skipped += len(pending) - count
+                pending = []
+                history_manager.save()
+    if pending:
+        count = history_manager.add_items(pending)
+        added += count
+        skipped += len(pending) - count
+        history_manager.save()
+    return added, skipped
+
+
+def import_record(history_manager, record, sidecar=None):
+    """导出记录对应的条目，图片写入 history_manager 的 blob 目录；图片数据缺失时返回 None"""
+    entry = {k: v for k, v in record.items() if k not in TRANSPORT_KEYS + INTERNAL_KEYS}
+    if entry.get("type") != "image":
+        return entry
+    suffix = history_manager.image_suffix(entry)
+    if "image_data" in record:
+        data = base64.b64decode(record["image_data"])
+        thumb = base64.b64decode(record["thumb_data"]) if "thumb_data" in record else None
+    elif sidecar is not None and entry.get("blob"):
+        data = sidecar.read(entry["blob"], suffix)
+        thumb = sidecar.read(entry["thumb"]) if entry.get("thumb") else None
+    else:
+        data = thumb = None
+    if data is None:
+        print(f"[ERROR] 导入的图片缺少数据，已跳过: {entry.get('blob')}")
+        return None
+    # 哈希按实际内容重新计算，文件被改动过也不会错配
+    blob_store = history_manager.blob_store
+    entry["blob"] = blob_store.put(data, suffix=suffix)
+    if thumb is not None:
+        entry["thumb"] = blob_store.put(thumb)
+    else:
+        entry.pop("thumb", None)
+    return entry
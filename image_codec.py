@@ -0,0 +1,71 @@
+import io
+
+from blob_store import image_format
+from image_hash import dhash
+
+# 复制文件时可以直接原样保存的图片类型
+IMAGE_FILE_SUFFIXES = (".png", ".webp", ".jpg", ".jpeg")
+
+
+class ImageCodec:
+    """图片编码设置，随任务一起传给编码进程（必须可以 pickle）
+
+    image_format: "png" 或 "webp"（无损）
+    png_compress_level: 0-9，越小越快、文件越大
+    webp_method: 0-6，越小越快、文件越大
+    perceptual_hash: 是否计算感知哈希（只有开启近似重复替换时才需要）
+    """
+
+    def __init__(self, image_format="png", png_compress_level=6, webp_method=4, perceptual_hash=False):
+        self.image_format = image_format
+        self.png_compress_level = png_compress_level
+        self.webp_method = webp_method
+        self.perceptual_hash = perceptual_hash
+
+    def save_options(self):
+        if self.image_format == "webp":
+            return {"format": "WEBP", "lossless": True, "method": self.webp_method}
+        return {"format": "PNG", "compress_level": self.png_compress_level}
+
+
+def make_thumbnail(img, thumb_size):
+    """生成列表缩略图（PNG）"""
+    from PIL import Image
+
+    thumb = img.copy()
+    thumb.thumbnail(thumb_size, Image.Resampling.LANCZOS)
+    buf = io.BytesIO()
+    thumb.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def encode_pixels(codec, mode, size, pixels, thumb_size):
+    """在编码进程中运行：原始像素 -> (图片数据, 宽, 高, 缩略图, 格式, 感知哈希)
+
+    返回值的顺序与 HistoryManager.make_image_entry 的参数一致；codec 未开启 perceptual_hash 时哈希为 None。
+    """
+    from PIL import Image
+
+    img = Image.frombytes(mode, size, pixels)
+    buf = io.BytesIO()
+    fmt = codec.image_format
+    try:
+        img.save(buf, **codec.save_options())
+    except (OSError, ValueError) as e:
+        # WebP 有尺寸上限（16383px），超出时退回 PNG
+        print(f"[ERROR] {fmt} 编码失败，改用 PNG: {e}")
+        buf = io.BytesIO()
+        img.save(buf, format="PNG", compress_level=codec.png_compress_level)
+        fmt = "png"
+    phash = dhash(img) if codec.perceptual_hash else None
+    return buf.getvalue(), img.width, img.height, make_thumbnail(img, thumb_size), fmt, phash
+
+
+def encode_file(data, thumb_size, perceptual_hash=False):
+    """已压缩的图片文件：原样保存，只解码一次用于读取尺寸和生成缩略图"""
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return (data, img.width, img.height, make_thumbnail(img, thumb_size), image_format(data),
+            dhash(img) if perceptual_hash else None)
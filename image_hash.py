@@ -0,0 +1,79 @@
+from collections import defaultdict
+
+# 感知哈希（dHash）：缩小为 (HASH_SIZE+1) x HASH_SIZE 的灰度图，比较每行相邻像素的明暗，
+# 得到 HASH_SIZE*HASH_SIZE 位。内容几乎相同的截图（光标闪烁、时钟变化）哈希只差几位。
+HASH_SIZE = 16
+HASH_BITS = HASH_SIZE * HASH_SIZE
+BAND_BITS = 16  # 索引把哈希切成若干段，每段 16 位
+
+
+def dhash(img):
+    """图片的 dHash，返回十六进制字符串（存进条目的 "phash" 字段）"""
+    from PIL import Image
+
+    small = img.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX).convert("L")
+    pixels = small.tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{value:0{HASH_BITS // 4}x}"
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class HashIndex:
+    """按汉明距离查找相近哈希的索引（多段索引）
+
+    哈希切成 HASH_BITS / BAND_BITS 段，每段按取值建倒排表。两个哈希相差不超过
+    段数 - 1 位时，至少有一段完全相同，所以只需在各段的倒排表里找候选，再逐个计算距离。
+    """
+
+    def __init__(self):
+        self.bands = HASH_BITS // BAND_BITS
+        self.postings = [defaultdict(set) for _ in range(self.bands)]
+        self.hashes = {}  # id -> 哈希（整数）
+
+    def split(self, value):
+        mask = (1 << BAND_BITS) - 1
+        return [(value >> (i * BAND_BITS)) & mask for i in range(self.bands)]
+
+    def add(self, entry_id, value):
+        self.hashes[entry_id] = value
+        for band, key in zip(self.postings, self.split(value)):
+            band[key].add(entry_id)
+
+    def remove(self, entry_id):
+        value = self.hashes.pop(entry_id, None)
+        if value is None:
+            return
+        for band, key in zip(self.postings, self.split(value)):
+            ids = band.get(key)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del band[key]
+
+    def clear(self):
+        for band in self.postings:
+            band.clear()
+        self.hashes.clear()
+
+    def near(self, value, max_distance):
+        """与 value 相差不超过 max_distance 位的 id，按距离从近到远排列"""
+        if max_distance >= self.bands:
+            candidates = self.hashes.keys()
+        else:
+            candidates = set()
+            for band, key in zip(self.postings, self.split(value)):
+                candidates.update(band.get(key, ()))
+        found = []
+        for entry_id in candidates:
+            distance = hamming(value, self.hashes[entry_id])
+            if distance <= max_distance:
+                found.append((distance, entry_id))
+        found.sort()
+        return [entry_id for _, entry_id in found]
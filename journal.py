@@ -0,0 +1,251 @@
+import json
+import os
+import threading
+
+from storage import StorageBackend
+
+
+# 条目写入后还会被 move/pin 记录修改的字段，占位条目以日志重放的结果为准
+MUTABLE_KEYS = ("time", "pinned", "copies")
+
+
+class HistoryJournal(StorageBackend):
+    """追加写的历史日志
+
+    每行一条 JSON 记录：
+        {"op": "insert", "entry": {...}}   在头部插入一项
+        {"op": "move", "index": i, "time": t, "copies": n}  把第 i 项移到头部（重复复制）
+        {"op": "evict", "count": n}        从尾部淘汰 n 项
+        {"op": "remove", "index": i, "digest": d}  删除第 i 项（淘汰策略跳过了固定条目时）
+        {"op": "pin", "digest": d, "pinned": bool}  固定/取消固定（批量固定时带 "index"，重放时不必逐条查找）
+        {"op": "clear"}                    清空
+    加载时按顺序重放；记录数过多时在后台线程压缩为只含 insert 的快照。
+
+    内容较大的 insert 记录写成 "元数据<TAB>条目" 两段（JSON 输出里不会出现原始 TAB），
+    加载时只解析元数据段，生成带 "lazy" 标记、"data" 为预览文本的占位条目，
+    完整内容由 load_payload() 按文件偏移按需读取。
+    """
+
+    def __init__(self, path, compact_threshold=500, lazy_bytes=4096, preview_chars=200):
+        self.path = path
+        self.compact_threshold = compact_threshold
+        self.lazy_bytes = lazy_bytes
+        self.preview_chars = preview_chars
+        self.payload_offsets = {}  # 占位条目的摘要 -> (文件偏移, 长度)
+        self.lock = threading.Lock()
+        self.record_count = 0
+        self.live_count = 0
+        self._compacting = False
+        self._tail = []  # 压缩期间追加的记录，替换文件后补写
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self, limit):
+        """重放日志，返回历史列表（最新在前）；大条目只返回占位条目
+
+        日志里只有内存窗口中的条目（包括超出 limit 的固定条目），因此全部返回，
+        超出预算的部分由 HistoryManager 的淘汰策略移除。
+        """
+        history = []
+        count = 0
+        offsets = {}
+        with open(self.path, 'rb') as f:
+            pos = 0
+            for lineno, raw in enumerate(f, 1):
+                start, pos = pos, pos + len(raw)
+                line = raw.rstrip(b"\r\n")
+                if not line.strip():
+                    continue
+                try:
+                    if b"\t" in line:
+                        head, payload = line.split(b"\t", 1)
+                        record = self._lazy_record(json.loads(head.decode('utf-8')))
+                        offsets[record["entry"]["digest"]] = (start + len(head) + 1, len(payload))
+                    else:
+                        record = json.loads(line.decode('utf-8'))
+                except (ValueError, KeyError):
+                    # 写入中途崩溃只会截断最后一行，跳过即可
+                    print(f"[ERROR] 日志第 {lineno} 行损坏，已跳过")
+                    continue
+                self._apply(history, record)
+                count += 1
+        with self.lock:
+            self.record_count = count
+            self.live_count = len(history)
+            self.payload_offsets = offsets
+        return history
+
+    @staticmethod
+    def _lazy_record(record):
+        meta = record["meta"]
+        stub = {
+            "type": meta["type"],
+            "data": meta["preview"],
+            "digest": meta["digest"],
+            "size": meta["size"],
+            "lazy": True,
+        }
+        stub.update((k, meta[k]) for k in MUTABLE_KEYS if k in meta)
+        return {"op": "insert", "entry": stub}
+
+    def load_payload(self, entry):
+        """读取占位条目的完整内容"""
+        if not entry.get("lazy"):
+            return entry
+        with self.lock:
+            offset, length = self.payload_offsets[entry["digest"]]
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                data = f.read(length)
+        full = json.loads(data.decode('utf-8'))
+        for k in MUTABLE_KEYS:
+            full.pop(k, None)
+            if k in entry:
+                full[k] = entry[k]
+        return full
+
+    def _encode(self, record):
+        """把记录编码为一行；大条目拆成元数据和内容两段"""
+        if record.get("op") == "insert":
+            entry = record["entry"]
+            payload = json.dumps(entry, ensure_ascii=False)
+            if len(payload) > self.lazy_bytes and "digest" in entry:
+                text = entry.get("data", "")
+                meta = {
+                    "type": entry.get("type", "text"),
+                    "digest": entry["digest"],
+                    "size": entry.get("length", len(text)),
+                    "preview": text[:self.preview_chars],
+                }
+                meta.update((k, entry[k]) for k in MUTABLE_KEYS if k in entry)
+                return json.dumps({"op": "insert", "meta": meta}, ensure_ascii=False) + "\t" + payload + "\n"
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+    @staticmethod
+    def _apply(history, record):
+        op = record.get("op")
+        if op == "insert":
+            history.insert(0, record["entry"])
+        elif op == "move":
+            index = record.get("index", 0)
+            if 0 < index < len(history):
+                history.insert(0, history.pop(index))
+            if history:
+                history[0].update((k, record[k]) for k in ("time", "copies") if k in record)
+        elif op == "remove":
+            index = record.get("index", -1)
+            if 0 <= index < len(history) and history[index].get("digest") == record.get("digest"):
+                del history[index]
+        elif op == "pin":
+            index = record.get("index")
+            if index is not None and 0 <= index < len(history) \
+                    and history[index].get("digest") == record.get("digest"):
+                targets = [history[index]]
+            else:
+                targets = history
+            for entry in targets:
+                if entry.get("digest") == record.get("digest"):
+                    if record.get("pinned"):
+                        entry["pinned"] = True
+                    else:
+                        entry.pop("pinned", None)
+        elif op == "evict":
+            n = record.get("count", 0)
+            if n > 0:
+                del history[-n:]
+        elif op == "clear":
+            history.clear()
+
+    def append(self, records):
+        """把记录追加到日志末尾，一次写入"""
+        if not records:
+            return
+        payload = "".join(self._encode(r) for r in records)
+        with self.lock:
+            # newline='\n' 保证写入的字节与 load() 计算的偏移一致
+            with open(self.path, 'a', encoding='utf-8', newline='\n') as f:
+                f.write(payload)
+            self.record_count += len(records)
+            for r in records:
+                op = r.get("op")
+                if op == "insert":
+                    self.live_count += 1
+                elif op == "evict":
+                    self.live_count = max(0, self.live_count - r.get("count", 0))
+                elif op == "remove":
+                    self.live_count = max(0, self.live_count - 1)
+                elif op == "clear":
+                    self.live_count = 0
+            if self._compacting:
+                self._tail.extend(records)
+
+    def needs_compaction(self, live_count):
+        with self.lock:
+            return (not self._compacting
+                    and self.record_count > self.compact_threshold
+                    and self.record_count > 2 * live_count)
+
+    def rewrite(self, history):
+        """用快照同步重写日志（history 最新在前）"""
+        if self._begin_compaction():
+            self._write_compacted(history)
+            with self.lock:
+                self.live_count = len(history)
+
+    def count(self):
+        with self.lock:
+            return self.live_count
+
+    def page(self, offset, limit):
+        # 日志后端的全部条目都在 HistoryManager 的内存窗口里
+        return []
+
+    def compact_async(self, snapshot, on_done=None):
+        """在后台线程中压缩，不阻塞调用方；完成后调用 on_done()"""
+        if not self._begin_compaction():
+            return
+
+        def worker():
+            self._write_compacted(snapshot)
+            if on_done:
+                on_done()
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _begin_compaction(self):
+        with self.lock:
+            if self._compacting:
+                return False
+            self._compacting = True
+            self._tail = []
+            return True
+
+    def _write_compacted(self, snapshot):
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8', newline='\n') as f:
+                for entry in reversed(snapshot):
+                    f.write(self._encode({"op": "insert", "entry": entry}))
+            with self.lock:
+                # 快照之后追加的记录需要补写到新文件
+                with open(tmp_path, 'a', encoding='utf-8', newline='\n') as f:
+                    for r in self._tail:
+                        f.write(self._encode(r))
+                    f.flush()
+                    os.fsync(f.fileno())
+                # 原子替换：崩溃时要么是旧日志，要么是完整的新日志
+                os.replace(tmp_path, self.path)
+                self.record_count = len(snapshot) + len(self._tail)
+                # 文件已重写，旧偏移失效
+                self.payload_offsets = {}
+        except Exception as e:
+            print(f"[ERROR] 压缩历史日志失败: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        finally:
+            with self.lock:
+                self._compacting = False
+                self._tail = []
@@ -1,63 +1,323 @@
+import time
+
+# 尽早记录启动时间，--profile-startup 的"导入模块"阶段从这里算起
+STARTED = time.perf_counter()
+
+import os
+import subprocess
 import sys
-import queue
-from PyQt6.QtWidgets import QApplication
+from multiprocessing import AuthenticationError
 
 from config import (
     MAX_ITEMS,
     POLL_INTERVAL,
-    QUEUE_POLL_MS,
+    CAPTURE_MAX_TEXT_BYTES,
+    CAPTURE_MAX_IMAGE_BYTES,
+    STORAGE_BACKEND,
     HISTORY_FILE,
+    SQLITE_FILE,
+    SQLITE_MAX_ITEMS,
+    MEMORY_BUDGET,
+    DISK_BUDGET,
+    MAX_AGE_DAYS,
+    PAGE_SIZE,
+    SEARCH_INDEX_MAX_CHARS,
+    SEARCH_RECENCY_WEIGHT,
+    SEARCH_FREQUENCY_WEIGHT,
+    TEXT_COMPRESS_THRESHOLD,
+    TEXT_COMPRESS_PREFIX_CHARS,
+    TEXT_COMPRESS_CODEC,
+    THUMB_SIZE,
+    IMAGE_FORMAT,
+    PNG_COMPRESS_LEVEL,
+    WEBP_METHOD,
+    IMAGE_ENCODE_WORKERS,
+    IMAGE_NEAR_DUPLICATE_DISTANCE,
+    PIXMAP_CACHE_BYTES,
+    PASTE_CACHE_BYTES,
+    PASTE_PREWARM_RECENT,
+    PASTE_DELAYED_RENDERING,
+    LEGACY_HISTORY_FILE,
+    JOURNAL_COMPACT_THRESHOLD,
+    JOURNAL_LAZY_BYTES,
+    SAVE_DELAY,
+    BLOB_DIR,
+    MOUSE_TRACKING,
+    METRICS_PORT,
+    METRICS_DUMP_FILE,
     HOTKEY,
+    IPC_ADDRESS,
+    IPC_AUTHKEY_FILE,
     WINDOW_TITLE,
     WINDOW_SIZE,
     FONT_SETTING,
     STATUS_FONT
 )
 from history_manager import HistoryManager
+from eviction import EvictionPolicy
+from journal import HistoryJournal
+from storage import SqliteStorage
 from clipboard_worker import ClipboardWorker
-from gui import ClipboardGUI
+from clipboard_source import Win32ClipboardSource
+from image_codec import ImageCodec
+from persistence import PersistenceThread
 from window_manager import get_active_window, HAS_WIN32
+from metrics import METRICS
+from history_service import (
+    HistoryServer, RemoteHistory, RemoteSearcher, default_address, create_authkey, read_authkey,
+    server_running
+)
 
 
-def main():
-    if not HAS_WIN32:
-        print("请安装 pywin32 后重试: pip install pywin32")
-        sys.exit(1)
+def create_storage():
+    """根据配置创建存储后端"""
+    if STORAGE_BACKEND == "sqlite":
+        return SqliteStorage(SQLITE_FILE, SQLITE_MAX_ITEMS, JOURNAL_COMPACT_THRESHOLD,
+                             DISK_BUDGET, max_age())
+    return HistoryJournal(HISTORY_FILE, JOURNAL_COMPACT_THRESHOLD, JOURNAL_LAZY_BYTES)
+
+
+def max_age():
+    return MAX_AGE_DAYS * 86400 if MAX_AGE_DAYS else None
+
+
+def create_policy(storage):
+    """内存窗口的淘汰策略；日志后端只保存窗口内的条目，磁盘预算也作用在窗口上"""
+    policy = EvictionPolicy(MAX_ITEMS, MEMORY_BUDGET, max_age())
+    if not storage.keeps_evicted:
+        policy = policy.combined(EvictionPolicy(None, DISK_BUDGET, max_age()))
+    return policy
+
+
+def start_metrics():
+    METRICS.enable()
+    if METRICS_PORT:
+        try:
+            METRICS.serve(METRICS_PORT)
+            print(f"统计数据: http://127.0.0.1:{METRICS_PORT}/metrics")
+        except OSError as e:
+            print(f"[ERROR] 无法开启统计端口 {METRICS_PORT}: {e}")
+
+
+def create_history_manager():
+    """创建 HistoryManager 并启动后台写盘线程"""
+    storage = create_storage()
+    history_manager = HistoryManager(
+        MAX_ITEMS, storage, LEGACY_HISTORY_FILE, BLOB_DIR, SEARCH_INDEX_MAX_CHARS,
+        TEXT_COMPRESS_THRESHOLD, TEXT_COMPRESS_PREFIX_CHARS, TEXT_COMPRESS_CODEC,
+        create_policy(storage), IMAGE_NEAR_DUPLICATE_DISTANCE
+    )
+    METRICS.add_source("history", lambda: {
+        "total": history_manager.get_total(),
+        "window": history_manager.get_length(),
+        "bytes_used": dict(history_manager.bytes_used),
+        "startup": dict(history_manager.startup_metrics),
+    })
+    # 后台合并写盘，采集线程不等待磁盘 I/O
+    writer = PersistenceThread(history_manager, SAVE_DELAY)
+    history_manager.writer = writer
+    writer.start()
+    return history_manager, writer
 
-    # 初始化组件
-    cmd_queue = queue.Queue()
-    history_manager = HistoryManager(MAX_ITEMS, HISTORY_FILE)
 
-    # 配置参数
-    config = {
+def create_worker(history_manager):
+    """创建剪贴板监听线程（未启动）"""
+    return ClipboardWorker(
+        history_manager, POLL_INTERVAL, THUMB_SIZE,
+        source=Win32ClipboardSource(CAPTURE_MAX_TEXT_BYTES, CAPTURE_MAX_IMAGE_BYTES),
+        codec=ImageCodec(IMAGE_FORMAT, PNG_COMPRESS_LEVEL, WEBP_METHOD,
+                         IMAGE_NEAR_DUPLICATE_DISTANCE is not None),
+        encode_workers=IMAGE_ENCODE_WORKERS,
+    )
+
+
+def gui_config():
+    """界面配置参数"""
+    return {
         "hotkey": HOTKEY,
         "window_title": WINDOW_TITLE,
         "window_size": WINDOW_SIZE,
         "font_setting": FONT_SETTING,
         "status_font": STATUS_FONT,
-        "queue_poll_ms": QUEUE_POLL_MS,
-        "cmd_queue": cmd_queue,
+        "page_size": PAGE_SIZE,
+        "thumb_size": THUMB_SIZE,
+        "pixmap_cache_bytes": PIXMAP_CACHE_BYTES,
+        "paste_cache_bytes": PASTE_CACHE_BYTES,
+        "paste_prewarm_recent": PASTE_PREWARM_RECENT,
+        "paste_delayed_rendering": PASTE_DELAYED_RENDERING,
+        "mouse_tracking": MOUSE_TRACKING,
+        "search_max_chars": SEARCH_INDEX_MAX_CHARS,
+        "search_recency_weight": SEARCH_RECENCY_WEIGHT,
+        "search_frequency_weight": SEARCH_FREQUENCY_WEIGHT,
         "get_active_window": get_active_window,
     }
 
+
+def arg_value(name, default=None):
+    """命令行中 name 后面的值，例如 --target 1234"""
+    if name in sys.argv:
+        i = sys.argv.index(name)
+        if i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+    return default
+
+
+def main():
+    """单进程模式：采集、历史和界面在同一个进程中"""
+    # Qt 只在需要界面的模式下导入，--daemon 不加载
+    from PyQt6.QtWidgets import QApplication
+    from gui import ClipboardGUI
+    from profiler import StartupProfiler, FirstPaintWatcher
+
+    profiler = StartupProfiler("--profile-startup" in sys.argv, STARTED)
+    profiler.mark("导入模块")
+    # 热点路径的计数和耗时统计，默认关闭
+    if "--metrics" in sys.argv:
+        start_metrics()
+
+    if not HAS_WIN32:
+        print("请安装 pywin32 后重试: pip install pywin32")
+        sys.exit(1)
+
+    # 初始化组件
+    history_manager, writer = create_history_manager()
+    profiler.mark("加载历史")
+
     # 启动剪贴板监听线程
-    worker = ClipboardWorker(history_manager, POLL_INTERVAL)
+    worker = create_worker(history_manager)
     worker.start()
+    profiler.mark("启动线程")
 
     # 启动 Qt 应用
     app = QApplication(sys.argv)
-    gui = ClipboardGUI(history_manager, config)
+    gui = ClipboardGUI(history_manager, gui_config())
     # 加载 QSS 样式
     with open("style.qss", "r", encoding="utf-8") as f:
         app.setStyleSheet(f.read())
+    profiler.mark("构建界面")
+
+    if profiler.enabled:
+        def on_first_paint():
+            profiler.mark("首次绘制")
+            profiler.report(history_manager.startup_metrics)
+            app.quit()
+        FirstPaintWatcher(gui, on_first_paint)
     gui.show()
 
+    exit_code = 0
     try:
-        sys.exit(app.exec())
+        exit_code = app.exec()
     except KeyboardInterrupt:
+        print("退出中...")
+    finally:
         worker.stop()
+        # 写完合并窗口内尚未保存的记录
+        writer.flush()
+        if METRICS.enabled:
+            METRICS.dump(METRICS_DUMP_FILE)
+    sys.exit(exit_code)
+
+
+def run_daemon():
+    """采集守护进程：不加载 Qt，只负责采集、保存和热键，通过 IPC 为界面和命令行提供查询
+
+    按下热键时让已连接的界面显示；没有界面时启动一个 --gui 客户端进程。
+    """
+    if "--metrics" in sys.argv:
+        start_metrics()
+
+    if not HAS_WIN32:
+        print("请安装 pywin32 后重试: pip install pywin32")
+        sys.exit(1)
+
+    address = IPC_ADDRESS or default_address()
+    # 在加载历史和更换密钥之前检查，不影响正在运行的采集进程
+    if server_running(address):
+        print(f"[ERROR] 已有采集进程在运行: {address}")
+        sys.exit(1)
+
+    history_manager, writer = create_history_manager()
+    worker = create_worker(history_manager)
+    worker.start()
+
+    server = HistoryServer(
+        history_manager, address, create_authkey(IPC_AUTHKEY_FILE),
+        {"max_chars": SEARCH_INDEX_MAX_CHARS, "recency_weight": SEARCH_RECENCY_WEIGHT,
+         "frequency_weight": SEARCH_FREQUENCY_WEIGHT}
+    )
+    server.start()
+    print(f"采集进程已启动: {server.address}")
+
+    gui_process = None
+
+    def on_hotkey():
+        nonlocal gui_process
+        # 热键按下时的前台窗口就是之后粘贴的目标
+        hwnd = get_active_window()
+        if server.request_show(hwnd):
+            return
+        if gui_process is not None and gui_process.poll() is None:
+            return  # 界面正在启动，连上之前不重复启动
+        command = [sys.executable, os.path.abspath(__file__), "--gui"]
+        if hwnd:
+            command += ["--target", str(hwnd)]
+        gui_process = subprocess.Popen(command)
+
+    import keyboard
+    keyboard.add_hotkey(HOTKEY, on_hotkey)
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
         print("退出中...")
+    finally:
+        server.stop()
+        worker.stop()
+        writer.flush()
+        if METRICS.enabled:
+            METRICS.dump(METRICS_DUMP_FILE)
+
+
+def run_client():
+    """界面客户端：连接采集进程显示历史，关闭窗口即退出"""
+    from PyQt6.QtWidgets import QApplication
+    from gui import ClipboardGUI
+
+    try:
+        remote = RemoteHistory(IPC_ADDRESS or default_address(),
+                               read_authkey(IPC_AUTHKEY_FILE), role="gui")
+    except (OSError, EOFError, AuthenticationError) as e:
+        print(f"[ERROR] 无法连接采集进程（先运行 python main.py --daemon）: {e}")
+        sys.exit(1)
+
+    config = gui_config()
+    # 热键由采集进程注册；搜索也在采集进程中进行
+    config.update(hotkey=None, exit_on_hide=True, searcher=RemoteSearcher(remote, PAGE_SIZE))
+
+    app = QApplication(sys.argv)
+    gui = ClipboardGUI(remote, config)
+    with open("style.qss", "r", encoding="utf-8") as f:
+        app.setStyleSheet(f.read())
+
+    def on_command(command, value):
+        if command == "show":
+            gui.request_show(value)
+        elif command == "closed":
+            gui.exit_requested.emit()
+    remote.on_command(on_command)
+
+    target = arg_value("--target")
+    gui.request_show(int(target) if target else None)
+    exit_code = app.exec()
+    remote.close()
+    sys.exit(exit_code)
 
 
 if __name__ == "__main__":
-    main()
+    if "--daemon" in sys.argv:
+        run_daemon()
+    elif "--gui" in sys.argv:
+        run_client()
+    else:
+        main()
@@ -0,0 +1,170 @@
+import json
+import threading
+import time
+
+# 延迟直方图的桶上界（毫秒），最后一个桶收集所有更慢的样本
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Histogram:
+    """固定分桶的延迟直方图，只记录计数，内存占用固定"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, pct):
+        """按桶上界估算分位数"""
+        rank = self.count * pct
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return min(BUCKETS_MS[i], self.max) if i < len(BUCKETS_MS) else self.max
+        return 0.0
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max,
+            "buckets": {str(b): n for b, n in zip(BUCKETS_MS + ("inf",), self.counts) if n},
+        }
+
+
+class Timer:
+    """with METRICS.timer("name"): ... 结束时把耗时记入直方图"""
+
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, (time.perf_counter() - self.started) * 1000)
+        return False
+
+
+class NullTimer:
+    """未启用时使用的空计时器，不读时钟也不加锁"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Metrics:
+    """热点路径的计数器和延迟直方图
+
+    默认关闭：关闭时 incr()/observe() 只检查一次 enabled，timer() 返回共享的空计时器。
+    add_source() 注册的函数在生成快照时调用，用于汇总各组件已有的统计（缓存命中率等）。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.started = time.time()
+        self.counters = {}
+        self.histograms = {}
+        self.sources = {}
+        self.lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+        self.started = time.time()
+
+    def incr(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, ms):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(ms)
+
+    def timer(self, name):
+        return Timer(self, name) if self.enabled else NULL_TIMER
+
+    def add_source(self, name, snapshot):
+        """snapshot(): 返回可以转成 JSON 的 dict"""
+        self.sources[name] = snapshot
+
+    def snapshot(self):
+        with self.lock:
+            data = {
+                "enabled": self.enabled,
+                "uptime_s": time.time() - self.started,
+                "counters": dict(self.counters),
+                "histograms": {k: h.snapshot() for k, h in self.histograms.items()},
+            }
+        for name, source in list(self.sources.items()):
+            try:
+                data[name] = source()
+            except Exception as e:
+                data[name] = {"error": str(e)}
+        return data
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+    def serve(self, port):
+        """在 127.0.0.1:port 提供 GET /metrics（JSON），只监听本机"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = json.dumps(metrics.snapshot(), ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# 全局实例，各模块直接导入使用
+METRICS = Metrics()
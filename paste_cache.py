@@ -0,0 +1,152 @@
+import io
+import threading
+from collections import OrderedDict, deque
+
+from PyQt6.QtCore import QMimeData
+from PyQt6.QtGui import QImage
+
+IMAGE_MIME = "application/x-qt-image"
+
+
+def image_to_dib(image_data):
+    """把已压缩的图片转换为 CF_DIB 数据（去掉文件头的 BMP）"""
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_data))
+    output = io.BytesIO()
+    image.save(output, format='BMP')
+    return output.getvalue()[14:]  # 移除BMP文件头
+
+
+class DelayedImageMimeData(QMimeData):
+    """延迟渲染的图片剪贴板数据
+
+    设置剪贴板时只声明有图片，目标程序真正读取时 Qt 才调用 retrieveData()，
+    这时再通过 loader 加载图片（Windows 上由 Qt 转换为 CF_DIB/CF_DIBV5）。
+    """
+
+    def __init__(self, loader):
+        super().__init__()
+        self.loader = loader
+        self.image = None
+
+    def formats(self):
+        return [IMAGE_MIME]
+
+    def hasFormat(self, mime):
+        return mime == IMAGE_MIME
+
+    def retrieveData(self, mime, preferred_type):
+        if mime != IMAGE_MIME:
+            return None
+        if self.image is None:
+            self.image = self.loader()
+        return self.image
+
+
+class PasteCache:
+    """图片条目的粘贴用数据缓存（CF_DIB 字节或 QImage），按字节数 LRU
+
+    prewarm() 把可能被粘贴的条目（最新的、当前选中的）放进队列，由后台线程提前生成，
+    粘贴时 get() 命中就不再需要解码和重新编码。
+    kind 为 "dib"（Windows API 粘贴）或 "image"（Qt 粘贴），由 use_dib 决定生成哪一种。
+    """
+
+    def __init__(self, history_manager, max_bytes, use_dib, max_pending=4):
+        self.history_manager = history_manager
+        self.max_bytes = max_bytes
+        self.kind = "dib" if use_dib else "image"
+        self.max_pending = max_pending
+        self.items = OrderedDict()  # blob 哈希 -> (数据, 字节数)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.pending = deque()  # 等待预热的条目，越靠前越优先
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def get(self, entry):
+        """返回已缓存的粘贴数据，没有则返回 None（不阻塞）"""
+        with self.condition:
+            item = self.items.get(entry.get("blob"))
+            if item is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(entry["blob"])
+            self.hits += 1
+            return item[0]
+
+    def put(self, blob, data):
+        size = len(data) if isinstance(data, bytes) else data.sizeInBytes()
+        with self.condition:
+            old = self.items.pop(blob, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            if size > self.max_bytes:
+                return
+            self.items[blob] = (data, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted) = self.items.popitem(last=False)
+                self.total_bytes -= evicted
+
+    def render(self, entry):
+        """同步生成条目的粘贴数据并放入缓存，失败返回 None"""
+        image_data = self.history_manager.read_image(entry)
+        if image_data is None:
+            return None
+        if self.kind == "dib":
+            data = image_to_dib(image_data)
+        else:
+            data = QImage.fromData(image_data)
+            if data.isNull():
+                return None
+        self.put(entry["blob"], data)
+        return data
+
+    def prewarm(self, entry, urgent=False):
+        """在后台生成条目的粘贴数据；urgent 的条目排在最前面"""
+        if not isinstance(entry, dict) or entry.get("type") != "image":
+            return
+        blob = entry.get("blob")
+        with self.condition:
+            if blob in self.items:
+                return
+            for queued in list(self.pending):
+                if queued.get("blob") == blob:
+                    self.pending.remove(queued)
+            if urgent:
+                self.pending.appendleft(entry)
+            else:
+                self.pending.append(entry)
+            while len(self.pending) > self.max_pending:
+                self.pending.pop()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                entry = self.pending.popleft()
+                if entry.get("blob") in self.items:
+                    continue
+            try:
+                self.render(entry)
+            except Exception as e:
+                print(f"[ERROR] 预热粘贴数据失败: {e}")
+
+    def stats(self):
+        with self.condition:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.items),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,175 @@
+import threading
+import time
+from collections import deque
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from metrics import METRICS
+
+# 粘贴的各个步骤，依次执行
+STEPS = ("set_clipboard", "confirm", "activate", "send_keys")
+STEP_NAMES = {
+    "set_clipboard": "设置剪贴板",
+    "confirm": "确认剪贴板",
+    "activate": "激活窗口",
+    "send_keys": "发送按键",
+}
+
+
+class PasteController(QObject):
+    """非阻塞的粘贴状态机
+
+    设置剪贴板 -> 确认剪贴板内容已就绪 -> 激活目标窗口 -> 发送 Ctrl+V。
+    需要等待的步骤用 QTimer 轮询条件，条件满足立即进入下一步，超时则放弃或继续，
+    期间不阻塞事件循环。每次粘贴各步骤的耗时记录在 metrics 中。
+
+    set_clipboard(entry): 设置剪贴板，返回判断内容已就绪的函数，失败返回 None
+    activate_window(hwnd): 激活窗口，成功返回 True
+    get_active_window(): 返回当前前台窗口句柄
+    own_window(): 返回本程序窗口句柄，用于 Alt+Tab 后判断是否已切走
+    """
+
+    finished = pyqtSignal(dict)  # 一次粘贴结束，参数为各步骤耗时（毫秒）
+
+    def __init__(self, set_clipboard, activate_window, get_active_window, own_window,
+                 poll_ms=5, confirm_timeout_ms=500, activate_timeout_ms=500, parent=None):
+        super().__init__(parent)
+        self.set_clipboard = set_clipboard
+        self.activate_window = activate_window
+        self.get_active_window = get_active_window
+        self.own_window = own_window
+        self.poll_ms = poll_ms
+        self.confirm_timeout_ms = confirm_timeout_ms
+        self.activate_timeout_ms = activate_timeout_ms
+        self.metrics = deque(maxlen=100)  # 最近若干次粘贴的耗时
+        self.metrics_lock = threading.Lock()  # stats() 由 --metrics 的 HTTP 线程调用
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(poll_ms)
+        self.timer.timeout.connect(self.poll)
+        self.waiting = None  # (等待的条件, 截止时间, 满足时的下一步, 超时时的处理)
+        self.current = None  # 当前粘贴的耗时记录
+
+    # ---------- 对外接口 ----------
+
+    def start(self, entry, target_window):
+        """开始粘贴；上一次还没结束时直接取消"""
+        if self.current is not None:
+            self.fail("被新的粘贴取消")
+        self.target_window = target_window
+        self.current = {"started": time.perf_counter(), "step_started": time.perf_counter()}
+
+        ready = None
+        try:
+            ready = self.set_clipboard(entry)
+        except Exception as e:
+            print(f"[ERROR] 设置剪贴板失败: {e}")
+        self.end_step("set_clipboard")
+        if ready is None:
+            self.fail("设置剪贴板失败")
+            return
+        self.wait_for(ready, self.confirm_timeout_ms, self.on_confirmed,
+                      lambda: self.fail("等待剪贴板就绪超时"))
+
+    def stats(self):
+        """最近若干次粘贴各步骤的平均耗时（毫秒）"""
+        with self.metrics_lock:
+            samples = list(self.metrics)
+        if not samples:
+            return {}
+        keys = STEPS + ("total",)
+        return {k: sum(m.get(k, 0) for m in samples) / len(samples) for k in keys}
+
+    # ---------- 状态机 ----------
+
+    def on_confirmed(self):
+        self.end_step("confirm")
+        target = self.target_window
+        if target and self.activate_window(target):
+            ready = lambda: self.get_active_window() == target
+        else:
+            # 没有记录目标窗口或激活失败：切回上一个窗口
+            import keyboard
+
+            keyboard.press_and_release("alt+tab")
+            own = self.own_window()
+            ready = lambda: self.get_active_window() not in (None, own)
+        self.wait_for(ready, self.activate_timeout_ms, self.on_activated, self.on_activate_timeout)
+
+    def on_activate_timeout(self):
+        # 与以前的行为一致：即使没确认到窗口切换也照常发送按键
+        print("[ERROR] 等待目标窗口激活超时")
+        self.on_activated()
+
+    def on_activated(self):
+        import keyboard
+
+        self.end_step("activate")
+        keyboard.press_and_release("ctrl+v")
+        self.end_step("send_keys")
+        self.finish()
+
+    # ---------- 辅助 ----------
+
+    def wait_for(self, condition, timeout_ms, on_ready, on_timeout):
+        """条件已满足时立即继续，否则由定时器轮询"""
+        if self.check(condition):
+            self.run(on_ready)
+            return
+        deadline = time.perf_counter() + timeout_ms / 1000
+        self.waiting = (condition, deadline, on_ready, on_timeout)
+        self.timer.start()
+
+    def poll(self):
+        if self.waiting is None:
+            self.timer.stop()
+            return
+        condition, deadline, on_ready, on_timeout = self.waiting
+        if self.check(condition):
+            self.stop_waiting()
+            self.run(on_ready)
+        elif time.perf_counter() >= deadline:
+            self.stop_waiting()
+            self.run(on_timeout)
+
+    def run(self, step):
+        try:
+            step()
+        except Exception as e:
+            self.fail(str(e))
+
+    @staticmethod
+    def check(condition):
+        try:
+            return bool(condition())
+        except Exception:
+            return False
+
+    def stop_waiting(self):
+        self.waiting = None
+        self.timer.stop()
+
+    def end_step(self, step):
+        now = time.perf_counter()
+        self.current[step] = (now - self.current["step_started"]) * 1000
+        self.current["step_started"] = now
+
+    def finish(self):
+        current = self.current
+        self.current = None
+        metrics = {k: current[k] for k in STEPS if k in current}
+        metrics["total"] = (time.perf_counter() - current["started"]) * 1000
+        with self.metrics_lock:
+            self.metrics.append(metrics)
+        for k, ms in metrics.items():
+            METRICS.observe(f"paste.{k}", ms)
+        print("粘贴完成: " + ", ".join(
+            f"{STEP_NAMES[k]} {metrics[k]:.0f} ms" for k in STEPS if k in metrics
+        ) + f", 总计 {metrics['total']:.0f} ms")
+        self.finished.emit(metrics)
+
+    def fail(self, reason):
+        print(f"[ERROR] 粘贴失败: {reason}")
+        METRICS.incr("paste.failed")
+        self.stop_waiting()
+        self.current = None
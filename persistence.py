@@ -0,0 +1,36 @@
+import threading
+
+
+class PersistenceThread(threading.Thread):
+    """后台持久化线程
+
+    采集线程和 GUI 只调用 request()，不等待磁盘 I/O。
+    收到第一个请求后等待 delay 秒，把这段时间内的所有 add_item/clear
+    合并成一次 HistoryManager.save()。退出前调用 flush() 写完剩余记录。
+    """
+
+    def __init__(self, history_manager, delay=1.0, daemon=True):
+        super().__init__(daemon=daemon)
+        self.history_manager = history_manager
+        self.delay = delay
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+
+    def request(self):
+        self.wakeup.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.wakeup.wait()
+            # 合并窗口：等待期间到达的请求一起写入；stop 时立即结束等待
+            self.stopped.wait(self.delay)
+            self.wakeup.clear()
+            self.history_manager.save()
+
+    def flush(self):
+        """停止线程并同步写入所有未保存的记录"""
+        self.stopped.set()
+        self.wakeup.set()
+        if self.is_alive():
+            self.join()
+        self.history_manager.save()
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+
+
+class PixmapCache:
+    """按字节数限制大小的 LRU 图片缓存
+
+    键一般为 (用途, blob 哈希)，例如 ("thumb", digest) 或 ("preview", digest)。
+    只在 GUI 线程中使用，不加锁。
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()  # key -> (pixmap, 字节数)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def pixmap_bytes(pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+    def get(self, key):
+        item = self.items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self.items.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def put(self, key, pixmap):
+        size = self.pixmap_bytes(pixmap)
+        old = self.items.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old[1]
+        if size > self.max_bytes:
+            return
+        self.items[key] = (pixmap, size)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted) = self.items.popitem(last=False)
+            self.total_bytes -= evicted
+
+    def get_or_load(self, key, loader):
+        pixmap = self.get(key)
+        if pixmap is None:
+            pixmap = loader()
+            self.put(key, pixmap)
+        return pixmap
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {
+            "entries": len(self.items),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+        }
+
+    def clear(self):
+        self.items.clear()
+        self.total_bytes = 0
@@ -0,0 +1,61 @@
+import threading
+
+from PyQt6.QtCore import QObject, Qt, pyqtSignal
+from PyQt6.QtGui import QImage
+
+from metrics import METRICS
+
+
+def load_blob_image(blob_store, digest, suffix=None):
+    """加载 blob 为 QImage（可以在非 GUI 线程中调用）"""
+    data = blob_store.pending_data(digest)
+    if data is None:
+        return QImage(blob_store.path(digest, suffix))
+    return QImage.fromData(data)
+
+
+class PreviewLoader(QObject):
+    """在后台线程解码并缩放预览图，完成后通过 loaded 信号送回 GUI 线程
+
+    只保留最新的一次请求，快速切换选中项时中间的条目不再解码。
+    QPixmap 只能在 GUI 线程中创建，所以这里产出 QImage，由接收方转换。
+    """
+
+    loaded = pyqtSignal(object, object)  # blob 哈希, 缩放后的 QImage（失败时为空图）
+
+    def __init__(self, history_manager, size=(400, 400), parent=None):
+        super().__init__(parent)
+        self.history_manager = history_manager
+        self.size = size
+        self.pending = None  # 等待加载的条目，新的请求直接覆盖
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def request(self, entry):
+        with self.condition:
+            self.pending = entry
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+                entry, self.pending = self.pending, None
+            try:
+                with METRICS.timer("gui.load_preview"):
+                    image = load_blob_image(
+                        self.history_manager.blob_store, entry["blob"],
+                        self.history_manager.image_suffix(entry)
+                    )
+                    if not image.isNull():
+                        image = image.scaled(
+                            *self.size, Qt.AspectRatioMode.KeepAspectRatio,
+                            Qt.TransformationMode.SmoothTransformation)
+            except Exception as e:
+                print(f"[ERROR] 加载预览图失败: {e}")
+                image = QImage()
+            self.loaded.emit(entry["blob"], image)
@@ -0,0 +1,58 @@
+import sys
+import time
+
+from PyQt6.QtCore import QObject, QEvent
+
+# 启动时应当按需加载、不应出现在 sys.modules 里的重量级模块
+# （win32clipboard 不在其中：采集线程在界面之前启动，一开始就要轮询剪贴板序列号）
+LAZY_MODULES = ("PIL", "pynput", "keyboard", "pythoncom", "pyperclip")
+
+
+class StartupProfiler:
+    """启动耗时分析（python main.py --profile-startup）
+
+    mark() 记录从上一个阶段结束到现在的耗时，首次绘制后由 report() 打印明细。
+    未启用时 mark() 直接返回，不影响正常启动。
+    """
+
+    def __init__(self, enabled=False, started=None):
+        self.enabled = enabled
+        self.started = started if started is not None else time.perf_counter()
+        self.last = self.started
+        self.phases = []  # (阶段名, 毫秒)
+
+    def mark(self, name):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((name, (now - self.last) * 1000))
+        self.last = now
+
+    def total_ms(self):
+        return (self.last - self.started) * 1000
+
+    def report(self, history_metrics=None):
+        print("===== 启动耗时 =====")
+        for name, ms in self.phases:
+            print(f"{name:<12}{ms:>9.1f} ms")
+        print(f"{'合计':<12}{self.total_ms():>9.1f} ms")
+        for key, ms in (history_metrics or {}).items():
+            print(f"{key:<24}{ms:>9.1f} ms")
+        loaded = [m for m in LAZY_MODULES if m in sys.modules]
+        print(f"已加载的可延迟模块: {', '.join(loaded) if loaded else '无'}")
+
+
+class FirstPaintWatcher(QObject):
+    """监听窗口的第一次 Paint 事件，然后调用 callback 并移除自身"""
+
+    def __init__(self, widget, callback):
+        super().__init__(widget)
+        self.widget = widget
+        self.callback = callback
+        widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if obj is self.widget and event.type() == QEvent.Type.Paint:
+            self.widget.removeEventFilter(self)
+            self.callback()
+        return False
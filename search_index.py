@@ -0,0 +1,85 @@
+from collections import defaultdict
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """增量维护的三元组（trigram）倒排索引，用于子串搜索
+
+    每个条目用一个整数 id 标识，索引保存小写后的搜索键。
+    查询时先求各 trigram 倒排表的交集得到候选，再逐个确认子串。
+    超过 max_chars 的长文本只索引前缀，其余部分在确认阶段检查。
+    连续输入时，如果新查询包含上一次的查询，直接在上次结果里缩小范围。
+    """
+
+    def __init__(self, max_chars=4096):
+        self.max_chars = max_chars
+        self.postings = defaultdict(set)  # trigram -> {id}
+        self.keys = {}                    # id -> 小写搜索键
+        self.long_ids = set()             # 只索引了前缀的长文本
+        self.last_query = None
+        self.last_result = set()
+
+    def add(self, entry_id, key):
+        """key: 已经小写的搜索键（见 history_entry.entry_search_key），直接保存不再复制"""
+        self.keys[entry_id] = key
+        if len(key) > self.max_chars:
+            self.long_ids.add(entry_id)
+        for gram in trigrams(key[:self.max_chars]):
+            self.postings[gram].add(entry_id)
+        # 保持缓存的上次结果有效
+        if self.last_query is not None and self.last_query in key:
+            self.last_result.add(entry_id)
+
+    def remove(self, entry_id):
+        key = self.keys.pop(entry_id, None)
+        if key is None:
+            return
+        self.long_ids.discard(entry_id)
+        self.last_result.discard(entry_id)
+        for gram in trigrams(key[:self.max_chars]):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self.postings[gram]
+
+    def clear(self):
+        self.postings.clear()
+        self.keys.clear()
+        self.long_ids.clear()
+        self.last_query = None
+        self.last_result = set()
+
+    def search(self, query):
+        """返回包含 query（不区分大小写）的 id 集合"""
+        query = query.lower()
+        if not query:
+            return set(self.keys)
+
+        if self.last_query is not None and self.last_query in query:
+            # 新查询更长：结果只可能是上次结果的子集
+            candidates = self.last_result
+        else:
+            candidates = self._candidates(query)
+
+        result = {i for i in candidates if query in self.keys[i]}
+        self.last_query = query
+        self.last_result = result
+        return set(result)
+
+    def _candidates(self, query):
+        grams = trigrams(query)
+        if not grams:
+            return self.keys.keys()
+
+        postings = sorted((self.postings.get(g, set()) for g in grams), key=len)
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            if not candidates:
+                break
+            candidates &= ids
+        # 长文本的后半部分没有索引，无法用倒排表排除
+        return candidates | self.long_ids
@@ -0,0 +1,406 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from eviction import EvictionPolicy, entry_bytes
+
+
+def escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class StorageBackend:
+    """历史记录存储后端接口
+
+    HistoryManager 只在内存中保留最近的若干条，其余由后端负责持久化。
+    写入以记录的形式传入（与日志格式相同）：
+        {"op": "insert", "entry": {...}}   在头部插入一项
+        {"op": "move", "index": i, "digest": d, "time": t, "copies": n}  把摘要为 d 的条目移到头部
+        {"op": "evict", "count": n}        尾部 n 项移出内存窗口
+        {"op": "remove", "index": i, "digest": d}  删除第 i 项（内存窗口之外的条目 index 为 None）
+        {"op": "pin", "digest": d, "pinned": bool}  固定/取消固定
+        {"op": "clear"}                    清空
+    """
+
+    # 移出内存窗口的条目是否仍保留在存储中（可以分页读取）
+    keeps_evicted = False
+
+    def exists(self):
+        """存储是否已存在（不存在时可以从旧格式迁移）"""
+        raise NotImplementedError
+
+    def load(self, limit):
+        """读取最新的 limit 条，最新在前"""
+        raise NotImplementedError
+
+    def load_payload(self, entry):
+        """load() 可能返回带 "lazy" 标记的占位条目，这里读取其完整内容"""
+        return entry
+
+    def append(self, records):
+        """持久化一批记录"""
+        raise NotImplementedError
+
+    def rewrite(self, history):
+        """用给定列表（最新在前）整体覆盖存储"""
+        raise NotImplementedError
+
+    def needs_compaction(self, live_count):
+        return False
+
+    def compact_async(self, snapshot, on_done=None):
+        if on_done:
+            on_done()
+
+    def count(self):
+        """存储中的总条数"""
+        raise NotImplementedError
+
+    def page(self, offset, limit):
+        """分页读取，最新在前"""
+        raise NotImplementedError
+
+    def search(self, text, skip, limit):
+        """在跳过最新 skip 条后搜索文本条目，最多返回 limit 条"""
+        return []
+
+    def fuzzy_candidates(self, terms, skip, batch=500):
+        """在跳过最新 skip 条后，按时间倒序生成可能模糊匹配 terms 的文本条目（可以多给）"""
+        return iter(())
+
+    def known_digests(self, digests):
+        """digests 中已存在于存储里的摘要集合；默认没有内存窗口之外的条目"""
+        return set()
+
+    def scan(self, batch=500, oldest_first=False):
+        """逐批读取存储中的全部条目（默认最新在前），用于导出和批量操作；
+        默认没有内存窗口之外的条目"""
+        return iter(())
+
+    def blob_refs(self, history):
+        """仍被引用的图片 blob 哈希集合；默认与内存中的历史一致"""
+        refs = set()
+        for e in history:
+            if isinstance(e, dict) and e.get("type") == "image":
+                refs.update(e[k] for k in ("blob", "thumb") if e.get(k))
+        return refs
+
+    def close(self):
+        pass
+
+
+class SqliteStorage(StorageBackend):
+    """SQLite 后端（WAL 模式）
+
+    每条历史是一行，按自增 id 倒序即为时间倒序；支持分页查询，
+    总条数上限 max_items 与内存窗口无关，启动时只读取第一页。
+    另外可以按类型限制磁盘字节数（byte_limits）和保留时间（max_age），固定的行不会被删除；
+    每行的字节数存在 bytes 列里，各类型合计在内存中增量维护，并在同一事务中写入 clip_totals 表，
+    启动时直接读取，不必扫描整张表。
+    """
+
+    keeps_evicted = True
+    # PRAGMA user_version：升级旧数据库（补列、回填字节数、建合计表）只在版本较低时执行一次
+    SCHEMA_VERSION = 2
+
+    def __init__(self, path, max_items, compact_threshold=500, byte_limits=None, max_age=None):
+        self.path = path
+        self.max_items = max_items
+        self.policy = EvictionPolicy(max_items, byte_limits, max_age)
+        self.compact_threshold = compact_threshold
+        self._existed = os.path.exists(path)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # SQLite 自带的 lower() 只处理 ASCII，这里用 Python 做不区分大小写的子串匹配
+        self.conn.create_function(
+            "icontains", 2, lambda text, query: text is not None and query in text.lower(),
+            deterministic=True,
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS clips ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " type TEXT NOT NULL,"
+            " blob TEXT,"
+            " digest TEXT,"
+            " entry TEXT NOT NULL)"
+        )
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+            self._upgrade()
+        self._count = self.conn.execute("SELECT COUNT(*) FROM clips").fetchone()[0]
+        self._bytes = {"text": 0, "image": 0}
+        self._bytes.update(self.conn.execute("SELECT kind, bytes FROM clip_totals"))
+        self._writes_since_compact = 0
+        self._compacting = False
+
+    def _upgrade(self):
+        """补齐旧数据库缺少的列、索引和合计表（全表扫描，只在升级时执行一次）"""
+        with self.conn:
+            columns = {r[1] for r in self.conn.execute("PRAGMA table_info(clips)")}
+            for column, decl in (("digest", "TEXT"), ("bytes", "INTEGER"),
+                                 ("pinned", "INTEGER NOT NULL DEFAULT 0"), ("created", "REAL")):
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE clips ADD COLUMN {column} {decl}")
+            # 旧数据库的行没有字节数和时间，按与 entry_bytes() 相同的规则补上
+            self.conn.execute(
+                "UPDATE clips SET bytes = CASE type WHEN 'image'"
+                " THEN COALESCE(json_extract(entry, '$.size'), 0)"
+                " ELSE COALESCE(length(json_extract(entry, '$.data')), 0)"
+                " + COALESCE(length(json_extract(entry, '$.payload')), 0) END,"
+                " created = json_extract(entry, '$.time')"
+                " WHERE bytes IS NULL"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS clips_blob ON clips(blob)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS clips_digest ON clips(digest)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS clips_created ON clips(created)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS clip_totals (kind TEXT PRIMARY KEY, bytes INTEGER NOT NULL)"
+            )
+            self.conn.execute("DELETE FROM clip_totals")
+            self.conn.execute(
+                "INSERT INTO clip_totals (kind, bytes)"
+                " SELECT CASE type WHEN 'image' THEN 'image' ELSE 'text' END, COALESCE(SUM(bytes), 0)"
+                " FROM clips GROUP BY 1"
+            )
+            self.conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def _save_totals(self):
+        """在当前事务中保存各类型的字节合计"""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO clip_totals (kind, bytes) VALUES (?, ?)", self._bytes.items()
+        )
+
+    def exists(self):
+        return self._existed
+
+    def load(self, limit):
+        return self.page(0, limit)
+
+    def page(self, offset, limit):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT entry FROM clips ORDER BY id DESC LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def count(self):
+        with self.lock:
+            return self._count
+
+    def _delete(self, where, params=()):
+        """删除满足条件的行，同时更新条数和各类型字节数"""
+        for kind, count, total in self.conn.execute(
+                "SELECT CASE type WHEN 'image' THEN 'image' ELSE 'text' END, COUNT(*), SUM(bytes)"
+                f" FROM clips WHERE {where} GROUP BY 1", params).fetchall():
+            self._count -= count
+            self._bytes[kind] -= total or 0
+        self.conn.execute(f"DELETE FROM clips WHERE {where}", params)
+
+    def _insert(self, entry):
+        digest = entry.get("digest")
+        if digest:
+            # 同样内容只保留最新一行（内存窗口之外的重复复制也会被去重）
+            self._delete("digest = ?", (digest,))
+        kind = "image" if entry.get("type") == "image" else "text"
+        size = entry_bytes(entry)
+        self.conn.execute(
+            "INSERT INTO clips (type, blob, digest, entry, bytes, pinned, created)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (entry.get("type", "text"), entry.get("blob"), digest,
+             json.dumps(entry, ensure_ascii=False), size, int(bool(entry.get("pinned"))),
+             entry.get("time")),
+        )
+        self._count += 1
+        self._bytes[kind] += size
+
+    def _move(self, digest, moved_at=None, copies=None):
+        """把条目复制为最新一行再删除旧行，同时更新最近复制时间和复制次数"""
+        row = self.conn.execute(
+            "SELECT id FROM clips WHERE digest = ? ORDER BY id DESC LIMIT 1", (digest,)
+        ).fetchone()
+        if row is None:
+            return
+        self.conn.execute(
+            "INSERT INTO clips (type, blob, digest, entry, bytes, pinned, created)"
+            " SELECT type, blob, digest,"
+            " json_set(entry, '$.time', COALESCE(?1, json_extract(entry, '$.time')),"
+            "                 '$.copies', COALESCE(?3, json_extract(entry, '$.copies'), 1)),"
+            " bytes, pinned, COALESCE(?1, created) FROM clips WHERE id = ?2",
+            (moved_at, row[0], copies)
+        )
+        self.conn.execute("DELETE FROM clips WHERE id = ?", (row[0],))
+
+    def _pin(self, digest, pinned):
+        if pinned:
+            self.conn.execute(
+                "UPDATE clips SET pinned = 1, entry = json_set(entry, '$.pinned', json('true'))"
+                " WHERE digest = ?", (digest,))
+        else:
+            self.conn.execute(
+                "UPDATE clips SET pinned = 0, entry = json_remove(entry, '$.pinned')"
+                " WHERE digest = ?", (digest,))
+
+    def _trim(self):
+        """按条数上限、字节预算和保留时间删除最旧的未固定记录"""
+        policy = self.policy
+        if policy.max_age:
+            self._delete("pinned = 0 AND created < ?", (time.time() - policy.max_age,))
+        if policy.count_over(self._count):
+            self._delete(
+                "id IN (SELECT id FROM clips WHERE pinned = 0 ORDER BY id LIMIT ?)",
+                (self._count - self.max_items,),
+            )
+        for kind in policy.over_kinds(self._bytes):
+            type_test = "type = 'image'" if kind == "image" else "type <> 'image'"
+            # 每次删除最旧的一行，直到回到预算以内
+            while self._bytes[kind] > policy.byte_limits[kind]:
+                row = self.conn.execute(
+                    f"SELECT id FROM clips WHERE pinned = 0 AND {type_test} ORDER BY id LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    break
+                self._delete("id = ?", (row[0],))
+
+    def append(self, records):
+        if not records:
+            return
+        with self.lock:
+            with self.conn:
+                for r in records:
+                    op = r.get("op")
+                    if op == "insert":
+                        self._insert(r["entry"])
+                    elif op == "move":
+                        self._move(r["digest"], r.get("time"), r.get("copies"))
+                    elif op == "pin":
+                        self._pin(r["digest"], r.get("pinned"))
+                    elif op == "remove":
+                        self._delete("digest = ?", (r["digest"],))
+                    elif op == "clear":
+                        self.conn.execute("DELETE FROM clips")
+                        self._count = 0
+                        self._bytes = {"text": 0, "image": 0}
+                    # evict 只表示移出内存窗口，数据库里保留，由 _trim 控制上限
+                self._trim()
+                self._save_totals()
+            self._writes_since_compact += len(records)
+
+    def rewrite(self, history):
+        with self.lock:
+            with self.conn:
+                self.conn.execute("DELETE FROM clips")
+                self._count = 0
+                self._bytes = {"text": 0, "image": 0}
+                for entry in reversed(history):
+                    self._insert(entry)
+                self._trim()
+                self._save_totals()
+
+    def needs_compaction(self, live_count):
+        with self.lock:
+            return not self._compacting and self._writes_since_compact > self.compact_threshold
+
+    def compact_async(self, snapshot, on_done=None):
+        """截断 WAL 文件，然后回调（用于清理 blob）"""
+        with self.lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+        def worker():
+            try:
+                with self.lock:
+                    self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                    self._writes_since_compact = 0
+            except Exception as e:
+                print(f"[ERROR] 压缩数据库失败: {e}")
+            finally:
+                with self.lock:
+                    self._compacting = False
+            if on_done:
+                on_done()
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def search(self, text, skip, limit):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT entry FROM (SELECT id, type, entry FROM clips ORDER BY id DESC LIMIT -1 OFFSET ?)"
+                " WHERE type = 'text' AND icontains(json_extract(entry, '$.data'), ?)"
+                " ORDER BY id DESC LIMIT ?",
+                (skip, text.lower(), limit),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def fuzzy_candidates(self, terms, skip, batch=500):
+        # LIKE '%a%b%c%' 即按顺序包含各字符，由 SQLite 先过滤；按 id 分批读取，批与批之间不持锁
+        patterns = ["%" + "%".join(escape_like(c) for c in term) + "%" for term in terms]
+        where = "".join(" AND lower(json_extract(entry, '$.data')) LIKE ? ESCAPE '\\'"
+                        for _ in patterns)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id FROM clips ORDER BY id DESC LIMIT 1 OFFSET ?", (skip,)
+            ).fetchone()
+        last_id = row[0] + 1 if row else None
+        while last_id is not None:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT id, entry FROM clips WHERE id < ? AND type = 'text'" + where
+                    + " ORDER BY id DESC LIMIT ?",
+                    (last_id, *patterns, batch),
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            for _, entry in rows:
+                yield json.loads(entry)
+
+    def known_digests(self, digests):
+        digests = list(digests)
+        known = set()
+        with self.lock:
+            # 每次查询的参数个数不超过 SQLite 的默认上限
+            for start in range(0, len(digests), 500):
+                chunk = digests[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT digest FROM clips WHERE digest IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                known.update(r[0] for r in rows)
+        return known
+
+    def scan(self, batch=500, oldest_first=False):
+        # 按 id 分批读取，批与批之间不持锁
+        order, compare = ("ASC", ">") if oldest_first else ("DESC", "<")
+        last_id = None
+        while True:
+            with self.lock:
+                if last_id is None:
+                    rows = self.conn.execute(
+                        f"SELECT id, entry FROM clips ORDER BY id {order} LIMIT ?", (batch,)
+                    ).fetchall()
+                else:
+                    rows = self.conn.execute(
+                        f"SELECT id, entry FROM clips WHERE id {compare} ? ORDER BY id {order} LIMIT ?",
+                        (last_id, batch),
+                    ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            for _, entry in rows:
+                yield json.loads(entry)
+
+    def blob_refs(self, history):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT blob FROM clips WHERE blob IS NOT NULL"
+                " UNION SELECT json_extract(entry, '$.thumb') FROM clips WHERE blob IS NOT NULL"
+            ).fetchall()
+        return {r[0] for r in rows if r[0]}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()